@@ -0,0 +1,64 @@
+"""
+Measure the import cost of every piscanner command.
+
+Each command is resolved in a fresh interpreter with `python -X importtime`,
+the self and cumulative times of all imported modules are summed and the
+heaviest top level imports are listed.
+
+Usage:
+    uv run python benchmarks/importtime.py [command ...]
+"""
+
+import subprocess
+import sys
+import time
+
+from piscanner.cli import COMMANDS
+
+
+def importtime(*args):
+    started = time.perf_counter()
+
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "piscanner", *args, "--help"],
+        capture_output=True,
+        text=True,
+    )
+
+    elapsed = time.perf_counter() - started
+
+    modules = []
+
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+
+        # nested imports are indented by two spaces per level
+        modules.append((int(self_us), int(cumulative_us), name[1:].rstrip()))
+
+    return elapsed, modules
+
+
+def main(commands):
+    for command in commands or ("", *COMMANDS):
+        elapsed, modules = importtime(*command.split())
+
+        total = sum(self_us for self_us, _, _ in modules)
+
+        print(
+            f"{command or '(group)':<10} {elapsed * 1000:8.1f} ms wall "
+            f"{total / 1000:8.1f} ms imports {len(modules):4} modules"
+        )
+
+        top_level = [m for m in modules if not m[2].startswith(" ")]
+
+        for _, cumulative_us, name in sorted(
+            top_level, key=lambda m: m[1], reverse=True
+        )[:5]:
+            print(f"{'':<10} {cumulative_us / 1000:8.1f} ms {name}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
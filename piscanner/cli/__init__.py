@@ -2,22 +2,39 @@ from importlib import import_module
 
 import click
 
+COMMANDS = {
+    "start": ("piscanner.cli.start", "start"),
+    "noop": ("piscanner.cli.noop", "noop"),
+    "populate": ("piscanner.cli.populate", "populate"),
+    "lights": ("piscanner.cli.lights", "lights"),
+    "cleanup": ("piscanner.cli.populate", "cleanup"),
+    "fleet": ("piscanner.cli.fleet", "fleet"),
+    "stats": ("piscanner.cli.stats", "stats"),
+    "loadtest": ("piscanner.cli.loadtest", "loadtest"),
+}
 
-@click.group()
+
+class LazyGroup(click.Group):
+    """
+    Click group importing each command module only when the command is used,
+    so running one command does not pay the import cost of all the others.
+    """
+
+    def list_commands(self, ctx):
+        return [*super().list_commands(ctx), *COMMANDS]
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in COMMANDS:
+            module, cmd = COMMANDS[cmd_name]
+            return getattr(import_module(module), cmd)
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(cls=LazyGroup)
 @click.pass_context
 def cli(ctx):
     pass
 
 
-for module, cmd in (
-    ("piscanner.cli.start", "start"),
-    ("piscanner.cli.noop", "noop"),
-    ("piscanner.cli.populate", "populate"),
-    ("piscanner.cli.lights", "lights"),
-    ("piscanner.cli.populate", "cleanup"),
-):
-    cli.add_command(getattr(import_module(module), cmd))
-
-
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,16 @@
+import asyncio
+
+import click
+
+
+@click.command(help="Aggregate the dashboards of many PiScanner stations")
+@click.argument("hosts", nargs=-1, required=True)
+@click.option("--port", default=9999, type=int, help="Dashboard port of the stations")
+@click.option("--listen", default=9998, type=int, help="Port of the fleet dashboard")
+@click.option("--interval", default=5, type=float, help="Seconds between polls")
+@click.option("--timeout", default=3, type=float, help="Timeout of a single poll")
+@click.option("--verbose", "-v", is_flag=True, help="Enable verbose output")
+def fleet(hosts, **opts):
+    from piscanner.core.fleet import start_fleet
+
+    asyncio.run(start_fleet(hosts, **opts))
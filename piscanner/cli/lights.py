@@ -5,6 +5,7 @@ import click
 from piscanner.utils.lights import (
     cleanup_gpio,
     flash_green,
+    flash_offline,
     flash_red,
     flash_yellow,
     setup_gpio,
@@ -13,7 +14,7 @@ from piscanner.utils.lights import (
 
 async def test_lights(**opts):
     while True:
-        for func in (flash_red, flash_green, flash_yellow):
+        for func in (flash_red, flash_green, flash_yellow, flash_offline):
             await func(**opts, verbose=True)
 
 
@@ -0,0 +1,103 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+
+import click
+
+
+@click.command(help="Load test the pipeline with virtual scanners and a local upstream")
+@click.option("--scanners", default=4, type=int, help="Number of virtual scanners")
+@click.option("--rate", default=1.0, type=float, help="Scans per second per scanner")
+@click.option("--duration", default=60, type=float, help="Seconds of scanning")
+@click.option(
+    "--shape",
+    default="steady",
+    type=click.Choice(("steady", "poisson", "burst")),
+    help="Distribution of the scans over time",
+)
+@click.option("--burst", default=10, type=int, help="Scans per burst with --shape burst")
+@click.option(
+    "--mode",
+    default="barcodes",
+    type=click.Choice(("barcodes", "keys")),
+    help="Store barcodes directly or type them as key events through the listener",
+)
+@click.option("--key-delay", default=0.0, type=float, help="Seconds between key events")
+@click.option("--latency", default=0.05, type=float, help="Upstream response time")
+@click.option("--error-rate", default=0.0, type=float, help="Share of upstream 503s")
+@click.option(
+    "--statuses",
+    default="Uploaded",
+    help='Weighted upstream statuses, like "Uploaded:95,Duplicate:5"',
+)
+@click.option(
+    "--format",
+    default="form",
+    type=click.Choice(("form", "json", "gzip")),
+    help="Upload format of the sender",
+)
+@click.option("--journal", is_flag=True, help="Capture scans through the scan journal")
+@click.option("--sleep", "sleep_duration", default=5, type=float, help="Sender poll interval")
+@click.option("--drain", default=60, type=float, help="Seconds to wait for pending acks")
+@click.option(
+    "--db",
+    help="Database file to use instead of a temporary one, its settings and "
+    "earlier rows are left untouched",
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the raw JSON")
+@click.option("--verbose", "-v", is_flag=True, help="Show the output of the services")
+def loadtest(db, as_json, verbose, **opts):
+    if db and opts["journal"]:
+        # the journal file sits next to the database, a station using it
+        # would be appending to the same file
+        raise click.UsageError("--journal cannot be used with --db")
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        # storage reads the path on import, so this has to come first
+        os.environ["PISCANNER_DB"] = db or os.path.join(directory, "loadtest.db")
+
+        from piscanner.core.loadtest import run_loadtest
+
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                stack.enter_context(
+                    contextlib.redirect_stdout(
+                        stack.enter_context(open(os.devnull, "w"))
+                    )
+                )
+
+            result = asyncio.run(run_loadtest(verbose=verbose, **opts))
+
+    if as_json:
+        from piscanner.utils.json import dumps
+
+        click.echo(dumps(result))
+        return
+
+    click.echo(
+        f"🏋️ {result.scanners} {result.mode} scanners, {result.shape}, "
+        f"{result.journal and 'journal, ' or ''}{result.seconds}s"
+    )
+    click.echo(
+        f"   scans: {result.scans} ({result.scans_per_second}/s), "
+        f"acked: {result.acked} ({result.acks_per_second}/s)"
+    )
+    click.echo(
+        "   scan to ack: "
+        + ", ".join(f"{k} {v} ms" for k, v in result.latency_ms.items() if v is not None)
+    )
+    for status, count in sorted(result.statuses.items(), key=lambda i: -i[1]):
+        click.echo(f"   {status}: {count}")
+    click.echo(f"   dropped: {result.dropped}, pending: {result.pending}")
+    click.echo(
+        "   upstream: "
+        + ", ".join(f"{k} {v}" for k, v in sorted(result.upstream_requests.items()))
+    )
+    click.echo(
+        f"   event loop: {result.loop_stalls} stalls, max lag {result.max_loop_lag_ms} ms"
+    )
+    click.echo(
+        f"   database: +{result.db_growth_bytes} bytes ({result.db_bytes_per_scan}/scan)"
+    )
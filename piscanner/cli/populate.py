@@ -4,8 +4,6 @@ import string
 
 import click
 
-from piscanner.utils.storage import cleanup_db, init, insert_barcode
-
 
 def barcode(prefix):
     return "{}X{}".format(
@@ -14,11 +12,15 @@ def barcode(prefix):
 
 
 async def log_insert(value):
+    from piscanner.utils.storage import insert_barcode
+
     print(value)
     return await insert_barcode(value)
 
 
 async def populate_initial_data(barcodes):
+    from piscanner.utils.storage import init
+
     await init()
 
     if barcodes:
@@ -38,6 +40,8 @@ async def populate_initial_data(barcodes):
 
 
 async def cleanup_database(seconds):
+    from piscanner.utils.storage import cleanup_db, init
+
     await init()
     return await cleanup_db(seconds)
 
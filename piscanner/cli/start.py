@@ -1,12 +1,14 @@
 import asyncio
 import contextlib
+import signal
+import sys
+import time
 import traceback
 from importlib import import_module
 
 import click
 
 from piscanner.utils.machine import is_mac
-from piscanner.utils.storage import init
 
 SERVICES = {
     "listener": ("piscanner.core.listener", "listener_coroutines"),
@@ -34,10 +36,79 @@ async def restart_on_failure(coroutine_func, *args, **kwargs):
             await asyncio.sleep(1)
 
 
-async def main(services, **kwargs):
+async def supervise_service(
+    service, verbose=False, watch_loop=False, min_delay=1, max_delay=30, stable=60
+):
+    """
+    Run a single service in its own process and restart it when it exits.
+
+    Restarts back off exponentially while the child keeps crashing and reset
+    once it stayed up for `stable` seconds.
+    """
+    args = [sys.executable, "-m", "piscanner", "start", service]
+
+    if verbose:
+        args.append("--verbose")
+
+    if watch_loop:
+        args.append("--watchdog")
+
+    delay = min_delay
+
+    while True:
+        started = time.monotonic()
+
+        process = await asyncio.create_subprocess_exec(*args)
+
+        try:
+            code = await process.wait()
+        finally:
+            if process.returncode is None:
+                process.terminate()
+                await process.wait()
+
+        if time.monotonic() - started >= stable:
+            delay = min_delay
+
+        print(f"🧑‍✈️ Service {service} exited with code {code}, restarting in {delay}s")
+
+        await asyncio.sleep(delay)
+
+        delay = min(delay * 2, max_delay)
+
+
+async def supervisor(services, **kwargs):
+
+    from piscanner.utils.storage import init
+
+    await init()
+
+    # stop the children as well when the supervisor is terminated
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel
+    )
+
+    with contextlib.suppress(asyncio.CancelledError):
+        await asyncio.gather(
+            *(supervise_service(service, **kwargs) for service in services)
+        )
+
+
+async def main(services, watch_loop=False, **kwargs):
+
+    from piscanner.utils.output import write_in_background
+    from piscanner.utils.storage import init
+    from piscanner.utils.watchdog import watchdog
+
+    # scanner input shares this loop, so output must never block it
+    write_in_background()
 
     await init()
 
+    if watch_loop:
+        asyncio.create_task(watchdog.run())
+        asyncio.create_task(watchdog.publish(",".join(sorted(services))))
+
     for func, args, opts in yield_coroutines(services):
         asyncio.create_task(restart_on_failure(func, *args, **opts, **kwargs))
 
@@ -47,7 +118,19 @@ async def main(services, **kwargs):
 @click.command(help="Start PiScanner services")
 @click.argument("services", nargs=-1, type=click.Choice(tuple(SERVICES.keys())))
 @click.option("--verbose", "-v", is_flag=True, help="Enable verbose output")
-def start(services, **opts):
+@click.option(
+    "--supervise",
+    "-s",
+    is_flag=True,
+    help="Run each service in its own process, restarting it independently",
+)
+@click.option(
+    "--watchdog",
+    "watch_loop",
+    is_flag=True,
+    help="Record event loop stalls, see /debug/loop/",
+)
+def start(services, supervise, **opts):
 
     services = set(services or SERVICES.keys())
 
@@ -55,4 +138,4 @@ def start(services, **opts):
         with contextlib.suppress(KeyError):
             services.remove("listener")
 
-    asyncio.run(main(services, **opts))
+    asyncio.run((supervise and supervisor or main)(services, **opts))
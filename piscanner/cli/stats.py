@@ -0,0 +1,43 @@
+import asyncio
+
+import click
+
+
+async def collect_stats(seconds):
+    from piscanner.utils.storage import get_stats, init
+
+    await init()
+    return await get_stats(seconds=seconds)
+
+
+@click.command(help="Show throughput and upload latency statistics")
+@click.option("--minutes", default=60, type=int, help="Time window to aggregate")
+@click.option("--json", "as_json", is_flag=True, help="Print the raw JSON")
+def stats(minutes, as_json):
+    result = asyncio.run(collect_stats(minutes * 60))
+
+    if as_json:
+        from piscanner.utils.json import dumps
+
+        click.echo(dumps(result))
+        return
+
+    click.echo(f"📊 Last {minutes} minutes")
+    click.echo(
+        f"   scans: {result.scans} ({result.scans_per_minute}/min, peak {result.peak_per_minute}/min)"
+    )
+    click.echo(
+        "   latency: "
+        + ", ".join(f"{k} {v} ms" for k, v in result.latency_ms.items() if v is not None)
+    )
+    for status, count in sorted(result.statuses.items(), key=lambda i: -i[1]):
+        click.echo(f"   {status}: {count}")
+    for device, values in sorted(result.devices.items()):
+        click.echo(
+            f"   ⌨️ {device}: {values.scans} ({values.scans_per_minute}/min)"
+            + (values.latency_ms is not None and f", latency {values.latency_ms} ms" or "")
+        )
+    click.echo(
+        f"   pending: {result.pending}"
+        + (result.pending_age_seconds and f", oldest {result.pending_age_seconds}s ago" or "")
+    )
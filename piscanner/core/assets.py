@@ -0,0 +1,142 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from aiohttp import web
+
+import piscanner
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(piscanner.__file__), "static")
+)
+
+# variants in order of preference, when accepted by the client
+ENCODINGS = ("br", "gzip", "identity")
+
+REVALIDATE = "no-cache"
+
+
+def compress(encoding, body):
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli:
+        return brotli.compress(body)
+
+
+class Asset:
+    """
+    A static file kept in memory together with its precompressed variants.
+
+    Assets are revalidated by the browser on every load, so a conditional
+    request is answered with a 304 until the file changes.
+    """
+
+    def __init__(self, name, body):
+        self.name = name
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.variants = {"identity": body}
+
+        for encoding in ENCODINGS:
+            compressed = compress(encoding, body)
+            if compressed and len(compressed) < len(body):
+                self.variants[encoding] = compressed
+
+    def negotiate(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+
+        for encoding in ENCODINGS:
+            if encoding in self.variants and (
+                encoding in accepted or encoding == "identity"
+            ):
+                return encoding
+
+    def response(self, request):
+        encoding = self.negotiate(request.headers.get("Accept-Encoding", ""))
+
+        # strong etags must differ between encodings of the same content
+        etag = encoding == "identity" and self.etag or f"{self.etag}-{encoding}"
+
+        headers = {
+            "ETag": f'"{etag}"',
+            "Cache-Control": REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            return web.Response(status=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        return web.Response(
+            body=self.variants[encoding],
+            content_type=self.content_type,
+            charset=self.content_type.startswith("text/") and "utf-8" or None,
+            headers=headers,
+        )
+
+
+def accepted_encodings(header):
+    accepted = set()
+
+    for part in header.split(","):
+        encoding, _, params = part.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) == 0:
+                continue
+        except ValueError:
+            pass
+        accepted.add(encoding.strip().lower())
+
+    return accepted
+
+
+def etag_matches(header, etag):
+    return any(
+        tag.strip().removeprefix("W/") in (f'"{etag}"', "*")
+        for tag in header.split(",")
+    )
+
+
+assets = {}
+
+
+def get_assets():
+    """
+    Load and compress the static files on first use.
+
+    Returns:
+        dict: Mapping of {name: Asset}
+    """
+    if not assets:
+        for name in sorted(os.listdir(STATIC_PATH)):
+            path = os.path.join(STATIC_PATH, name)
+
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    asset = Asset(name, f.read())
+
+                assets[name] = asset
+
+    return assets
+
+
+async def serve_main_app(request):
+    return get_assets()["index.html"].response(request)
+
+
+async def serve_static(request):
+    name = request.match_info["name"]
+
+    if not (asset := get_assets().get(name)):
+        raise web.HTTPNotFound()
+
+    return asset.response(request)
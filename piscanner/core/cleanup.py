@@ -1,16 +1,24 @@
 import asyncio
 
-from piscanner.utils.storage import cleanup_db
+from piscanner.utils.storage import cleanup_db, get_tuning
 
 
-async def start_cleanup(verbose, sleep_duration=3600, seconds=86400):
+async def start_cleanup(verbose, sleep_duration=None, seconds=None):
+
+    # RETENTION_HOURS and CLEANUP_INTERVAL unless given explicitly
+    tuning = await get_tuning()
+
+    if seconds is None:
+        seconds = tuning.RETENTION_HOURS * 3600
 
     count = await cleanup_db(seconds=seconds)
 
     if verbose or count > 0:
         print(f"🧹 Deleted {count} records")
 
-    await asyncio.sleep(sleep_duration)
+    await asyncio.sleep(
+        tuning.CLEANUP_INTERVAL if sleep_duration is None else sleep_duration
+    )
 
 
 def cleanup_coroutines(*args, **opts):
@@ -0,0 +1,159 @@
+import asyncio
+import time
+import traceback
+from collections import deque
+
+from piscanner.core.journal import ingest
+from piscanner.utils.datastructures import data
+from piscanner.utils.ratelimit import TokenBucket
+from piscanner.utils.storage import get_tuning, timestamp
+from piscanner.utils.tuning import tuning
+
+pipelines = {}
+
+
+def device_id(device):
+    """
+    Identify a scanner by vendor and product id plus its serial, or the
+    physical port when it has none, so identical scanners stay apart.
+    """
+    info = device.info
+
+    return f"{info.vendor:04x}:{info.product:04x}:{device.uniq or device.phys}"
+
+
+def device_metrics():
+    return {name: pipeline.metrics() for name, pipeline in pipelines.items()}
+
+
+class DevicePipeline:
+    """
+    Bounded queue between the key events of one scanner and storage.
+
+    Decoding never waits on storage: barcodes are queued and stored in order
+    by a task of their own, at most `rate` per second when set. When the
+    queue is full new barcodes are dropped and counted, so a scanner flooding
+    events is throttled without slowing down the other scanners. A barcode
+    repeated within DEDUPE_SECONDS is ignored.
+    """
+
+    def __init__(self, device=None, maxsize=100, rate=None):
+        self.device = device
+        self.queue = asyncio.Queue(maxsize)
+        self.rate = TokenBucket(tuning.DEVICE_RATE if rate is None else rate)
+        self.last = (None, 0)
+        self.scans = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latency = None
+        self.stored = deque(maxlen=10000)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    def put(self, barcode):
+        now = time.monotonic()
+        last, last_at = self.last
+
+        # the window starts at the accepted scan, so repeating a barcode
+        # slower than DEDUPE_SECONDS always counts
+        if barcode == last and now - last_at < tuning.DEDUPE_SECONDS:
+            self.duplicates += 1
+            return False
+
+        try:
+            self.queue.put_nowait((barcode, timestamp(), now))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+            if self.dropped == 1 or not self.dropped % 100:
+                print(f"⚠️ Scanner {self.device} is flooding, dropped {self.dropped} scans")
+
+            return False
+
+        self.last = (barcode, now)
+
+        return True
+
+    async def run(self):
+        while True:
+            barcode, created_timestamp, started = await self.queue.get()
+
+            try:
+                await self.rate.acquire()
+                await ingest(
+                    barcode, device=self.device, created_timestamp=created_timestamp
+                )
+            except Exception:
+                self.failed += 1
+                print(f"⚠️ Failed to store barcode {barcode} from {self.device}:")
+                traceback.print_exc()
+            else:
+                now = time.monotonic()
+                self.scans += 1
+                self.stored.append(now)
+
+                # moving average, recent scans weigh more
+                latency = (now - started) * 1000
+
+                if self.latency is None:
+                    self.latency = latency
+                else:
+                    self.latency = self.latency * 0.8 + latency * 0.2
+            finally:
+                self.queue.task_done()
+
+    def set_rate(self, rate):
+        if rate != self.rate.rate:
+            self.rate = TokenBucket(rate)
+
+    async def close(self):
+        """Store what is still queued, then stop."""
+        await self.queue.join()
+        self.task.cancel()
+
+    def metrics(self):
+        since = time.monotonic() - 60
+
+        while self.stored and self.stored[0] < since:
+            self.stored.popleft()
+
+        return data(
+            scans=self.scans,
+            scans_per_minute=len(self.stored),
+            duplicates=self.duplicates,
+            dropped=self.dropped,
+            failed=self.failed,
+            queued=self.queue.qsize(),
+            latency_ms=self.latency is not None and round(self.latency, 1) or None,
+            rate=self.rate.rate,
+        )
+
+
+async def start_devices(interval=1, verbose=False, report=60):
+    """
+    Apply the DEVICE_RATE and DEDUPE_SECONDS settings to every pipeline as
+    they change, printing the pipeline metrics every `report` seconds.
+    """
+    reported = time.monotonic()
+
+    while True:
+        rate = (await get_tuning()).DEVICE_RATE
+
+        for pipeline in pipelines.values():
+            pipeline.set_rate(rate)
+
+        if verbose and time.monotonic() - reported >= report:
+            reported = time.monotonic()
+
+            for name, pipeline in pipelines.items():
+                print(f"⌨️ Scanner {name}: {pipeline.metrics()}")
+
+        await asyncio.sleep(interval)
+
+
+def devices_coroutines(*args, **opts):
+    yield start_devices, args, opts
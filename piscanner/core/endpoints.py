@@ -0,0 +1,225 @@
+import asyncio
+import re
+import ssl
+import time
+from collections import defaultdict
+
+import aiohttp
+
+from piscanner.utils.batching import AdaptiveBatch
+from piscanner.utils.breaker import OPEN, CircuitBreaker
+from piscanner.utils.datastructures import data
+from piscanner.utils.functions import to_float, to_int
+from piscanner.utils.ratelimit import TokenBucket
+
+DEFAULT_ENDPOINT = "default"
+DEFAULT_PATTERN = "[0-9]+X.*"
+
+ENDPOINT_SETTINGS = data(
+    TOKEN="",
+    URL="",
+    BARCODE_VAR="",
+    HOSTNAME_VAR="",
+    STATUS_VAR="",
+    INSECURE="",
+    FORMAT="",
+    PATTERN="",
+    BATCH="",
+    BATCH_MIN="",
+    BATCH_MAX="",
+    BATCH_TARGET="",
+    CONCURRENCY="",
+    RATE_REQUESTS="",
+    RATE_BARCODES="",
+    QUEUE="",
+)
+
+endpoints = {}
+
+
+def endpoint_settings(settings):
+    """
+    Split the flat settings into one group per endpoint.
+
+    Unprefixed keys (URL, TOKEN, ...) configure the default endpoint, keys
+    prefixed with a name (inventory.URL, inventory.PATTERN, ...) configure the
+    named endpoint. Named endpoints without a URL are ignored.
+
+    Returns:
+        dict: Mapping of {name: settings}, named endpoints first
+    """
+    groups = defaultdict(dict)
+
+    for key, value in settings.items():
+        name, _, key = key.rpartition(".")
+        if key in ENDPOINT_SETTINGS:
+            groups[name or DEFAULT_ENDPOINT][key] = value
+
+    default = groups.pop(DEFAULT_ENDPOINT, {})
+
+    result = {
+        name: data(ENDPOINT_SETTINGS, **values)
+        for name, values in sorted(groups.items())
+        if values.get("URL")
+    }
+    result[DEFAULT_ENDPOINT] = data(ENDPOINT_SETTINGS, **default)
+
+    return result
+
+
+def is_offline():
+    return any(endpoint.breaker.is_open for endpoint in endpoints.values())
+
+
+def is_pending():
+    """
+    Whether an endpoint with a URL still has records to send, from the
+    queues of this process without reading the database.
+    """
+    return any(
+        endpoint.settings.URL and (endpoint.queue or endpoint.behind is not None)
+        for endpoint in endpoints.values()
+    )
+
+
+def endpoint_metrics():
+    """Upload state of the endpoints running in this process."""
+    return {
+        name: {
+            "url": endpoint.settings.URL,
+            "breaker": endpoint.breaker.state,
+            "queued": len(endpoint.queue),
+            "sending": len(endpoint.sending),
+            "retry_in": max(0, round(endpoint.retry_at - time.monotonic(), 1)),
+            **endpoint.batch.metrics(),
+        }
+        for name, endpoint in endpoints.items()
+    }
+
+
+def create_ssl_context(insecure=False):
+    ssl_context = ssl.create_default_context()
+
+    if insecure:
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE  # Disable cert verification
+
+    return ssl_context
+
+
+class Endpoint:
+    """
+    Upload state of a single remote endpoint: its own queue of pending
+    records, connection pool, adaptive batch size, concurrency limit, rate
+    limits and breaker.
+    """
+
+    def __init__(self, name, settings):
+        self.name = name
+        self.settings = settings
+
+        try:
+            self.pattern = re.compile(settings.PATTERN or DEFAULT_PATTERN)
+        except re.error as e:
+            print(f"⚠️ Invalid pattern for endpoint {name}: {e}")
+            self.pattern = None
+
+        self.batch = AdaptiveBatch(
+            size=to_int(settings.BATCH, 100),
+            minimum=to_int(settings.BATCH_MIN, 10),
+            maximum=to_int(settings.BATCH_MAX, 1000),
+            target=to_int(settings.BATCH_TARGET, 5),
+        )
+        self.concurrency = to_int(settings.CONCURRENCY, 1)
+
+        self.breaker = CircuitBreaker()
+
+        # requests and barcodes per second, 0 means unlimited
+        self.request_rate = TokenBucket(to_float(settings.RATE_REQUESTS, 0))
+        self.barcode_rate = TokenBucket(to_float(settings.RATE_BARCODES, 0))
+
+        # monotonic time before which the server asked not to be contacted
+        self.retry_at = 0
+
+        # record id -> barcode, in the order they were scanned
+        self.queue = {}
+        self.queue_limit = to_int(settings.QUEUE, 2000)
+        self.sending = set()
+        self.wakeup = asyncio.Event()
+
+        # first record id left in the database while the queue could not
+        # take more, the sender catches up from there
+        self.behind = None
+
+        self.session = None
+        self.task = None
+        self.tasks = set()
+
+    def match(self, barcode):
+        return self.pattern and self.pattern.match(barcode)
+
+    def accepts(self, extra=0):
+        """
+        Whether the sender should hand more records to this endpoint, on top
+        of `extra` records about to be queued.
+        """
+        return (
+            len(self.queue) + extra < self.queue_limit
+            and self.breaker.state != OPEN
+        )
+
+    def enqueue(self, records):
+        self.queue.update(records)
+        self.wakeup.set()
+
+    def next_batch(self, size):
+        """
+        Collect up to `size` distinct barcodes that are not being sent yet.
+
+        Returns:
+            dict: Mapping of {barcode: [record_ids]}
+        """
+        batch = defaultdict(list)
+
+        for id, barcode in self.queue.items():
+            if id in self.sending:
+                continue
+            if barcode not in batch and len(batch) >= size:
+                break
+            batch[barcode].append(id)
+            self.sending.add(id)
+
+        return batch
+
+    def done(self, ids):
+        self.sending.difference_update(ids)
+        self.wakeup.set()
+
+    async def get_session(self):
+        if self.session is None:
+            # loading the system certificates blocks for tens of milliseconds
+            ssl_context = await asyncio.to_thread(
+                create_ssl_context, bool(self.settings.INSECURE)
+            )
+
+            # another batch may have created it in the meantime
+            if self.session is None:
+                self.session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=self.concurrency, ssl=ssl_context
+                    ),
+                    timeout=aiohttp.ClientTimeout(total=60, connect=10),
+                )
+
+        return self.session
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+
+        # batches already sent have to store their statuses, or they would be
+        # sent again by the next endpoint
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        if self.session:
+            await self.session.close()
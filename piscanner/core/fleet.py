@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web
+
+from piscanner.core.assets import get_assets, serve_static
+from piscanner.utils.breaker import OPEN, CircuitBreaker
+from piscanner.utils.datastructures import data
+from piscanner.utils.machine import get_local_hostname, is_ipv4
+
+stations = {}
+
+
+def station_url(host, port=9999):
+    """
+    Build the refresh url of a station from a host name, host:port or url.
+    Bare host names are resolved through mDNS, like `get_local_hostname`.
+    """
+    if "://" in host:
+        return f"{host.rstrip('/')}/refresh/"
+
+    name, _, host_port = host.partition(":")
+
+    if "." not in name and not is_ipv4(name) and name != "localhost":
+        name = f"{name}.local"
+
+    return f"http://{name}:{host_port or port}/refresh/"
+
+
+def add_station(host, port=9999):
+    stations[host] = data(
+        host=host,
+        url=station_url(host, port),
+        hostname=None,
+        etag=None,
+        summary={},
+        last_seen=None,
+        error=None,
+        # unreachable stations are polled less and less often
+        breaker=CircuitBreaker(threshold=1, min_interval=5, max_interval=300),
+    )
+
+
+async def poll_station(session, station, timeout=3, verbose=False):
+    """
+    Fetch the station summary. The etag of the last payload is sent along,
+    so an unchanged station answers with an empty 304.
+    """
+    headers = station.etag and {"If-None-Match": station.etag} or None
+
+    try:
+        async with session.get(
+            station.url,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+
+            if response.status != 304:
+                response.raise_for_status()
+
+                payload = await response.json()
+
+                station.etag = response.headers.get("ETag")
+                station.hostname = payload.get("hostname")
+                station.summary = payload.get("summary") or {}
+
+            if verbose:
+                print(f"🛰️ {station.host} answered {response.status}")
+
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        station.error = e.__class__.__name__
+        station.breaker.failure()
+
+        if verbose:
+            print(f"🛰️ {station.host} failed: {e!r}")
+    else:
+        station.error = None
+        station.last_seen = time.time()
+        station.breaker.success()
+
+
+async def poll_stations(session, interval=5, timeout=3, verbose=False):
+    while True:
+        await asyncio.gather(
+            *(
+                poll_station(session, station, timeout=timeout, verbose=verbose)
+                for station in stations.values()
+                if station.breaker.state != OPEN
+            )
+        )
+
+        await asyncio.sleep(interval)
+
+
+def station_data(station, now):
+    summary = station.summary
+    completed = summary.get("total", 0) - summary.get("pending", 0)
+
+    return {
+        "host": station.host,
+        "hostname": station.hostname,
+        "url": station.url.removesuffix("refresh/"),
+        "online": station.last_seen is not None and not station.error,
+        "error": station.error,
+        "backlog": summary.get("pending", 0),
+        "errors": summary.get("errors", 0),
+        "error_rate": completed and round(summary.get("errors", 0) / completed, 3),
+        "last_scan": summary.get("last_scan"),
+        "last_seen": station.last_seen and round(now - station.last_seen, 1),
+    }
+
+
+async def fleet_data(request):
+    now = time.time()
+    result = [station_data(station, now) for station in stations.values()]
+
+    return web.json_response(
+        {
+            "hostname": get_local_hostname(),
+            "stations": result,
+            "totals": {
+                "stations": len(result),
+                "online": sum(s["online"] for s in result),
+                "backlog": sum(s["backlog"] for s in result),
+                "errors": sum(s["errors"] for s in result),
+            },
+        }
+    )
+
+
+async def serve_fleet_app(request):
+    return get_assets()["fleet.html"].response(request)
+
+
+async def start_fleet(
+    hosts, port=9999, listen=9998, interval=5, timeout=3, verbose=False
+):
+
+    for host in hosts:
+        add_station(host, port=port)
+
+    app = web.Application()
+
+    app.router.add_get("/", serve_fleet_app)
+    app.router.add_get("/static/{name}", serve_static, name="static")
+    app.router.add_get("/fleet/", fleet_data)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+
+    site = web.TCPSite(runner, "0.0.0.0", listen)
+    await site.start()
+
+    print(f"🛰️ Watching {len(stations)} stations on http://{get_local_hostname()}:{listen}...")
+
+    # one pooled client for the whole fleet
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=32, limit_per_host=1)
+    ) as session:
+        await poll_stations(session, interval=interval, timeout=timeout, verbose=verbose)
@@ -0,0 +1,103 @@
+import asyncio
+import os
+
+from piscanner.utils.journal import Journal
+from piscanner.utils.storage import (
+    DB_FILE,
+    get_journal_sequence,
+    get_settings,
+    insert_barcode,
+    merge_journal,
+    timestamp,
+)
+
+JOURNAL_FILE = f"{os.path.splitext(DB_FILE)[0]}.journal"
+
+journal = Journal(JOURNAL_FILE)
+
+# merge as soon as this many scans are waiting, even before the interval
+journal_batch = 500
+
+merge_now = asyncio.Event()
+
+
+async def ingest(barcode, device=None, created_timestamp=None):
+    """
+    Capture a scan: appended to the journal when it is open, otherwise, or
+    when the journal is full, inserted into the database directly.
+    """
+    created_timestamp = created_timestamp or timestamp()
+
+    if journal.is_open and (
+        written := journal.append(barcode, created_timestamp, device)
+    ):
+        await asyncio.to_thread(journal.sync, *written)
+
+        if len(journal.pending) >= journal_batch:
+            merge_now.set()
+    else:
+        await insert_barcode(
+            barcode, device=device, created_timestamp=created_timestamp
+        )
+
+
+async def merge(verbose=False):
+    records = journal.pending[:]
+
+    if count := await merge_journal(records):
+        journal.merged(records[-1][0])
+
+        if verbose:
+            print(f"📓 Merged {count} journal records")
+
+    return count
+
+
+async def start_journal(interval=2, verbose=False, enable=None):
+    """
+    Open the scan journal while the JOURNAL setting is on, or when `enable`
+    overrides it, and merge it into the database every `interval` seconds.
+    Records left by a crash are replayed on start, even when the setting has
+    been turned off since.
+    """
+    enabled = None
+
+    if os.path.exists(JOURNAL_FILE):
+        journal.open(await get_journal_sequence())
+
+        if count := await merge(verbose=verbose):
+            print(f"📓 Replayed {count} journal records")
+
+    try:
+        while True:
+            wanted = enable
+
+            if wanted is None:
+                wanted = bool((await get_settings()).JOURNAL)
+
+            if wanted != enabled:
+                enabled = wanted
+
+                if verbose:
+                    print(f"📓 Scan journal {enabled and 'on' or 'off'}")
+
+            if enabled and not journal.is_open:
+                journal.open(await get_journal_sequence())
+
+            await merge(verbose=verbose)
+
+            if journal.is_open and not enabled and not journal.pending:
+                journal.close()
+
+            merge_now.clear()
+
+            try:
+                await asyncio.wait_for(merge_now.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        journal.close()
+
+
+def journal_coroutines(*args, **opts):
+    yield start_journal, args, opts
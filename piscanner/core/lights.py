@@ -1,22 +1,32 @@
 import asyncio
 import datetime
 
-from piscanner.utils.lights import flash_green, flash_red, flash_yellow
-from piscanner.utils.storage import read
+from piscanner.utils.lights import flash_green, flash_offline, flash_red, flash_yellow
+from piscanner.utils.storage import get_tuning, read_recent
+from piscanner.core.endpoints import is_offline, is_pending
 from piscanner.core.server import is_success, is_recent
 
 
-async def start_lights(check_seconds=1, wait_timout=1, verbose=False):
+async def start_lights(check_seconds=1, wait_timout=None, verbose=False):
     while True:
 
+        # also refreshes the light durations used by every flash
+        tuning = await get_tuning()
+
+        if is_offline():
+            await flash_offline()
+            continue
+
         record = None
 
-        async for record in read(limit=1):
+        async for record in read_recent(limit=1):
             pass
 
         if record:
 
-            if not record.completed_timestamp:
+            # anything still waiting for the server, not only the last scan,
+            # as queued by the sender running in this process
+            if not record.completed_timestamp or is_pending():
                 await flash_yellow()
 
             if is_success(record.status):
@@ -27,7 +37,9 @@ async def start_lights(check_seconds=1, wait_timout=1, verbose=False):
             await flash_yellow()
 
         # Wait before checking again
-        await asyncio.sleep(wait_timout)
+        await asyncio.sleep(
+            tuning.LIGHTS_INTERVAL if wait_timout is None else wait_timout
+        )
 
 
 def lights_coroutines(*args, **opts):
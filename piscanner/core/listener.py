@@ -5,8 +5,14 @@ from asyncio.tasks import ensure_future
 import evdev
 from evdev.ecodes import ecodes
 
+from piscanner.core.devices import (
+    DevicePipeline,
+    device_id,
+    devices_coroutines,
+    pipelines,
+)
+from piscanner.core.journal import journal_coroutines
 from piscanner.utils.machine import get_hostname
-from piscanner.utils.storage import insert_barcode
 
 BARCODE_TERMINATOR = ecodes["KEY_ENTER"]
 
@@ -17,22 +23,60 @@ KEY_RIGHTSHIFT = ecodes["KEY_RIGHTSHIFT"]
 
 async def print_events(device, verbose=False):
 
-    scancodes = dict(codes())
-    shifted_scancodes = dict(shifted_codes())
-    buffer = ""
-    shift_pressed = False
-
     if verbose:
         print(
             f"⌨️ Listening on {device.name} at {device.path}, VID={device.info.vendor}, PID={device.info.product}, Serial={device.uniq}"
         )
 
+    await handle_events(
+        device.async_read_loop(), device=device_id(device), verbose=verbose
+    )
+
+
+async def handle_events(events, device=None, verbose=False):
+    """
+    Store every barcode typed in a stream of input events, through a pipeline
+    of its own for each device.
+
+    Args:
+        events: async iterable of evdev input events, from a device or from
+            the virtual scanners of the loadtest
+        device (str): identifier stored with every barcode
+        verbose (bool): print every barcode
+    """
+    pipeline = pipelines[device] = DevicePipeline(device).start()
+
+    try:
+        async for barcode in read_barcodes(events):
+            if verbose:
+                print("⌨️ ", device, barcode)
+            pipeline.put(barcode)
+    finally:
+        # barcodes already read are still stored after the device goes away
+        ensure_future(pipeline.close())
+
+
+async def read_barcodes(events):
+    """
+    Decode key events into barcodes, ended by the terminator key.
+
+    Args:
+        events: async iterable of evdev input events
+
+    Yields:
+        str: each complete barcode, stripped
+    """
+    scancodes = dict(codes())
+    shifted_scancodes = dict(shifted_codes())
+    buffer = ""
+    shift_pressed = False
+
     # print("KEY_ENTER: {} EV_KEY: {}".format(KEY_ENTER, EV_KEY))
     # print("Scancodes", scancodes)
     # print("Shifted scancodes", shifted_scancodes)
     # print("-" * 20)
 
-    async for event in device.async_read_loop():
+    async for event in events:
 
         if event.type == EV_KEY:
             key_event = evdev.categorize(event)
@@ -49,10 +93,8 @@ async def print_events(device, verbose=False):
                 # print("GOT CODE", code, "SHIFT:", shift_pressed)
 
                 if code == BARCODE_TERMINATOR:
-                    if buffer:  # Only print if there's content
-                        if verbose:
-                            print("⌨️ ", buffer.strip())
-                        ensure_future(insert_barcode(buffer.strip()))
+                    if buffer:  # Only yield if there's content
+                        yield buffer.strip()
 
                     buffer = ""
                 else:
@@ -147,3 +189,6 @@ def listener_coroutines(*args, **opts):
 
     for device in devices:
         yield print_events, args, {"device": device, **opts}
+
+    yield from journal_coroutines(*args, **opts)
+    yield from devices_coroutines(*args, **opts)
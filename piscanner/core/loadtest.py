@@ -0,0 +1,389 @@
+import asyncio
+import contextlib
+import os
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from piscanner.utils.datastructures import data
+from piscanner.utils.storage import (
+    DB_FILE,
+    PERCENTILES,
+    db_readonly,
+    init,
+    timestamp,
+)
+
+SHAPES = ("steady", "poisson", "burst")
+
+
+def parse_statuses(value):
+    """
+    Parse weighted upstream statuses, like "Uploaded:95,Duplicate:5".
+
+    Returns:
+        tuple: (list of statuses, list of weights)
+    """
+    statuses, weights = [], []
+
+    for part in value.split(","):
+        status, _, weight = part.strip().partition(":")
+        if status:
+            statuses.append(status)
+            weights.append(float(weight or 1))
+
+    return statuses, weights
+
+
+def upstream_app(latency=0.05, error_rate=0, statuses="Uploaded"):
+    """
+    Local stand-in for the upstream URL.
+
+    Every request waits around `latency` seconds, fails with a 503 with
+    probability `error_rate` and otherwise answers a status per barcode,
+    picked from the weighted `statuses`. Form requests get a {barcode: status}
+    mapping, json and gzip requests a list in the order of the barcodes.
+    """
+    choices, weights = parse_statuses(statuses)
+
+    app = web.Application()
+    app["requests"] = Counter()
+
+    async def upload(request):
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+
+        if random.random() < error_rate:
+            app["requests"]["failed"] += 1
+            raise web.HTTPServiceUnavailable()
+
+        app["requests"]["ok"] += 1
+
+        if request.content_type == "application/json":
+            barcodes = (await request.json())["barcode"]
+            status = random.choices(choices, weights, k=len(barcodes))
+        else:
+            barcodes = (await request.post()).getall("barcode", [])
+            status = dict(zip(barcodes, random.choices(choices, weights, k=len(barcodes))))
+
+        return web.json_response({"status": status})
+
+    app.router.add_post("/", upload)
+
+    return app
+
+
+def intervals(rate, shape="steady", burst=10):
+    """
+    Yield the seconds to wait before each scan, averaging `rate` scans per
+    second.
+
+    steady: evenly spaced scans
+    poisson: exponentially distributed gaps, like independent operators
+    burst: `burst` scans back to back, then a pause keeping the average rate
+    """
+    while True:
+        if shape == "poisson":
+            yield random.expovariate(rate)
+        elif shape == "burst":
+            yield from (0 for _ in range(burst - 1))
+            yield burst / rate
+        else:
+            yield 1 / rate
+
+
+def key_codes():
+    """
+    Map every character a scanner can type to its key code and shift state,
+    reversing the listener tables.
+
+    Returns:
+        dict: {char: (code, shifted)}
+    """
+    from piscanner.core.listener import codes, shifted_codes
+
+    keys = {char: (code, True) for code, char in shifted_codes()}
+    keys.update((char, (code, False)) for code, char in codes())
+
+    return keys
+
+
+async def key_events(barcodes, key_delay=0):
+    """
+    Type barcodes as a HID scanner would, one evdev event per key press and
+    release, ended by the terminator key.
+
+    Args:
+        barcodes: async iterable of barcodes to type
+        key_delay (float): seconds between two key events
+    """
+    import evdev
+
+    from piscanner.core.listener import BARCODE_TERMINATOR, EV_KEY, KEY_LEFTSHIFT
+
+    keys = key_codes()
+
+    def event(code, value):
+        now = time.time()
+        return evdev.InputEvent(int(now), int(now % 1 * 1e6), EV_KEY, code, value)
+
+    async for barcode in barcodes:
+        for char in barcode:
+            code, shifted = keys[char]
+
+            presses = shifted and (KEY_LEFTSHIFT, code) or (code,)
+
+            for value, pressed in ((1, presses), (0, reversed(presses))):
+                for key in pressed:
+                    yield event(key, value)
+                    await asyncio.sleep(key_delay)
+
+        yield event(BARCODE_TERMINATOR, 1)
+        yield event(BARCODE_TERMINATOR, 0)
+
+
+async def virtual_scanner(number, scans, stats, rate, duration, mode, **opts):
+    """
+    Produce scans at `rate` per second for `duration` seconds, either typed
+    as key events through the listener or handed to the capture path as
+    barcodes. Every scan is recorded in `scans` as {barcode: scan timestamp}.
+    """
+    gaps = intervals(rate, shape=opts.get("shape"), burst=opts.get("burst"))
+
+    async def produce():
+        deadline = time.monotonic() + duration
+
+        for sequence in range(1 << 31):
+            await asyncio.sleep(next(gaps))
+
+            if time.monotonic() >= deadline:
+                return
+
+            barcode = f"44X{number:03d}n{sequence:07d}"
+            scans[barcode] = timestamp()
+
+            yield barcode
+
+    if mode == "keys":
+        from piscanner.core.listener import handle_events
+
+        await handle_events(
+            key_events(produce(), key_delay=opts.get("key_delay")),
+            device=f"virtual:{number}",
+        )
+        return
+
+    from piscanner.core.journal import ingest
+
+    async for barcode in produce():
+        stats.inserts.add(
+            asyncio.ensure_future(ingest(barcode, device=f"virtual:{number}"))
+        )
+
+
+def db_size(path=DB_FILE):
+    size = 0
+    for name in (path, f"{path}-wal", f"{path}-shm"):
+        with contextlib.suppress(FileNotFoundError):
+            size += os.stat(name).st_size
+    return size
+
+
+def percentiles(values):
+    """Nearest-rank percentiles, exact where `get_stats` rounds to buckets."""
+    values = sorted(values)
+
+    return {
+        f"p{p}": values and values[max(1, (len(values) * p + 99) // 100) - 1] or None
+        for p in PERCENTILES
+    }
+
+
+async def collect_results(scans, after_id=0):
+    """
+    Read back the rows stored by this run.
+
+    Returns:
+        dict: {barcode: (completed timestamp or None, status)}
+    """
+    async with db_readonly() as db:
+        cursor = await db.execute(
+            "SELECT barcode, completed_timestamp, status FROM barcodes WHERE id > ?",
+            (after_id,),
+        )
+        return {
+            barcode: (completed, status)
+            async for barcode, completed, status in cursor
+            if barcode in scans
+        }
+
+
+async def count_rows(after_id=0):
+    """
+    Returns:
+        tuple: (rows stored after `after_id`, rows still pending)
+    """
+    async with db_readonly() as db:
+        cursor = await db.execute(
+            "SELECT COUNT(*), COUNT(*) - COUNT(completed_timestamp) FROM barcodes WHERE id > ?",
+            (after_id,),
+        )
+        return await cursor.fetchone()
+
+
+async def last_id():
+    async with db_readonly() as db:
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM barcodes")
+        (id,) = await cursor.fetchone()
+        return id
+
+
+async def run_loadtest(
+    scanners=4,
+    rate=1.0,
+    duration=60,
+    shape="steady",
+    burst=10,
+    mode="barcodes",
+    key_delay=0,
+    latency=0.05,
+    error_rate=0,
+    statuses="Uploaded",
+    format="form",
+    journal=False,
+    port=0,
+    sleep_duration=5,
+    drain=60,
+    verbose=False,
+):
+    """
+    Run virtual scanners against the listener, sender and a local upstream
+    stand-in, then measure what came out.
+
+    Returns:
+        dict: scans, throughput, scan-to-ack latency percentiles (ms),
+        statuses, dropped and pending scans, database growth
+    """
+    from piscanner.core.endpoints import endpoints
+    from piscanner.core.journal import start_journal
+    from piscanner.core.sender import start_sender
+    from piscanner.utils.watchdog import watchdog
+
+    asyncio.create_task(watchdog.run())
+
+    await init()
+
+    upstream = upstream_app(latency=latency, error_rate=error_rate, statuses=statuses)
+
+    runner = web.AppRunner(upstream)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    host, port = runner.addresses[0][:2]
+
+    # the settings and the pending rows of the database are left alone, it
+    # may be shared with a running station: the sender gets its own settings
+    # and only sends the rows of this run
+    settings = data(URL=f"http://{host}:{port}/", FORMAT=format)
+
+    size_before = db_size()
+    first_id = await last_id()
+
+    scans = {}
+    stats = data(inserts=set())
+
+    services = [
+        asyncio.create_task(
+            start_sender(
+                sleep_duration=sleep_duration,
+                verbose=verbose,
+                after_id=first_id,
+                settings=settings,
+            )
+        ),
+    ]
+
+    if journal:
+        services.append(
+            asyncio.create_task(start_journal(verbose=verbose, enable=True))
+        )
+
+    started = time.monotonic()
+
+    try:
+        await asyncio.gather(
+            *(
+                virtual_scanner(
+                    number,
+                    scans,
+                    stats,
+                    rate=rate,
+                    duration=duration,
+                    mode=mode,
+                    shape=shape,
+                    burst=burst,
+                    key_delay=key_delay,
+                )
+                for number in range(scanners)
+            )
+        )
+
+        scanned = time.monotonic() - started
+
+        # inserts are not awaited by the listener either
+        await asyncio.gather(*stats.inserts, return_exceptions=True)
+
+        deadline = time.monotonic() + drain
+
+        while time.monotonic() < deadline:
+            stored, pending = await count_rows(first_id)
+
+            if stored >= len(scans) and not pending:
+                break
+
+            await asyncio.sleep(1)
+
+        elapsed = time.monotonic() - started
+    finally:
+        for task in services:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        for endpoint in endpoints.values():
+            await endpoint.close()
+        await runner.cleanup()
+
+    results = await collect_results(scans, first_id)
+
+    latencies = [
+        completed - scans[barcode]
+        for barcode, (completed, _) in results.items()
+        if completed is not None
+    ]
+
+    growth = db_size() - size_before
+
+    return data(
+        scanners=scanners,
+        mode=mode,
+        journal=journal,
+        shape=shape,
+        seconds=round(elapsed, 1),
+        scans=len(scans),
+        scans_per_second=round(len(scans) / max(scanned, 1e-9), 2),
+        acked=len(latencies),
+        acks_per_second=round(len(latencies) / max(elapsed, 1e-9), 2),
+        latency_ms={
+            "average": latencies and round(sum(latencies) / len(latencies)) or None,
+            **percentiles(latencies),
+        },
+        statuses=dict(Counter(status for _, status in results.values())),
+        dropped=len(scans) - len(results),
+        pending=len(results) - len(latencies),
+        upstream_requests=dict(upstream["requests"]),
+        loop_stalls=watchdog.count,
+        max_loop_lag_ms=round(watchdog.max_lag * 1000),
+        db_growth_bytes=growth,
+        db_bytes_per_scan=scans and round(growth / len(scans)) or 0,
+    )
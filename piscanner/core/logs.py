@@ -0,0 +1,140 @@
+import asyncio
+import os
+
+from aiohttp import web
+
+from piscanner.utils.functions import to_int
+
+LOGS_PATH = os.path.expanduser("~/logs")
+
+
+def log_path(name):
+    """Resolve a log file name, refusing anything outside LOGS_PATH."""
+    path = os.path.join(LOGS_PATH, os.path.basename(name))
+
+    if not os.path.isfile(path):
+        raise web.HTTPNotFound()
+
+    return path
+
+
+def tail_lines(path, lines=200, block_size=8192, max_bytes=4 * 1024 * 1024):
+    """
+    Read the last `lines` lines of a file by reading blocks backwards from the
+    end, so the cost depends on the lines returned and not the file size.
+
+    Returns:
+        tuple: (list of lines, position right after the last line, as given
+        to `read_from`)
+    """
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        chunks = []
+        newlines = 0
+
+        while position > 0 and newlines <= lines and end - position < max_bytes:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            chunk = f.read(size)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+
+    content = b"".join(reversed(chunks))
+
+    # an incomplete last line is left to the follower
+    complete = content.rfind(b"\n") + 1
+    end -= len(content) - complete
+    content = content[:complete]
+
+    # the first line is cut when reading did not reach the start of the file
+    if position > 0:
+        content = content[content.find(b"\n") + 1 :]
+
+    result = content.decode(errors="replace").splitlines()
+
+    return result[-lines:] if lines else [], (stat.st_dev, stat.st_ino, end)
+
+
+def read_from(path, position, max_bytes=1024 * 1024):
+    """
+    Read the complete lines appended after `position`, at most `max_bytes`
+    at a time, the rest is left to the next call.
+
+    Args:
+        position: (device, inode, offset) returned by `tail_lines` or a
+            previous call
+
+    Returns:
+        tuple: (list of lines, new position)
+    """
+    device, inode, offset = position
+
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        end = f.seek(0, os.SEEK_END)
+
+        # the file was rotated (another file now has the name) or truncated,
+        # start over from its beginning
+        if (stat.st_dev, stat.st_ino) != (device, inode) or end < offset:
+            offset = 0
+
+        f.seek(offset)
+        content = f.read(min(end - offset, max_bytes))
+
+    complete = content.rfind(b"\n") + 1
+
+    # a line longer than a whole read is passed on in pieces
+    if not complete and len(content) == max_bytes:
+        complete = len(content)
+
+    return (
+        content[:complete].decode(errors="replace").splitlines(),
+        (stat.st_dev, stat.st_ino, offset + complete),
+    )
+
+
+async def tail_log(request):
+    """
+    Return the last lines of a log file, or stream new lines as server-sent
+    events with ?follow=1.
+
+    Query:
+        lines: number of lines to return first (default: 200)
+        follow: 1 or true to keep the connection open and send appended
+            lines
+        interval: seconds between checks for new lines while following
+    """
+    path = log_path(request.match_info["name"])
+
+    lines = to_int(request.query.get("lines"), 200, minimum=0)
+    interval = to_int(request.query.get("interval"), 1)
+
+    result, position = await asyncio.to_thread(tail_lines, path, lines)
+
+    if request.query.get("follow", "").lower() not in ("1", "true"):
+        return web.Response(text="".join(f"{line}\n" for line in result))
+
+    response = web.StreamResponse(
+        headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+    )
+    await response.prepare(request)
+
+    idle = 0
+
+    while True:
+        if result:
+            await response.write(
+                "".join(f"data: {line}\n\n" for line in result).encode()
+            )
+            idle = 0
+        elif (idle := idle + interval) >= 15:
+            # keeps proxies from closing an idle stream
+            await response.write(b": keep-alive\n\n")
+            idle = 0
+
+        await asyncio.sleep(interval)
+
+        result, position = await asyncio.to_thread(read_from, path, position)
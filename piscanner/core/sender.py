@@ -1,16 +1,31 @@
 import asyncio
+import email.utils
+import gzip
+import random
 import re
-import ssl
+import time
+import traceback
 from asyncio.tasks import ensure_future
 from collections import defaultdict
 from urllib.parse import parse_qs, urlparse
 
 import aiohttp
 
+from piscanner.core.endpoints import Endpoint, endpoint_settings, endpoints
+from piscanner.utils.breaker import CLOSED, HALF_OPEN, OPEN
 from piscanner.utils.datastructures import data
+from piscanner.utils.functions import jitter
+from piscanner.utils.json import dumps
 from piscanner.utils.lights import flash_green, flash_red
 from piscanner.utils.machine import get_hostname
-from piscanner.utils.storage import get_settings, read, set_setting, set_status_mapping
+from piscanner.utils.storage import (
+    get_settings,
+    get_tuning,
+    read,
+    set_setting,
+    set_status_mapping,
+)
+from piscanner.utils.tuning import TUNABLES, parse_tunable
 
 
 async def attempt_status_parse(response, settings, verbose):
@@ -28,78 +43,216 @@ async def attempt_status_parse(response, settings, verbose):
         return content.get(settings.STATUS_VAR or "status")
 
 
-async def handle_remote_barcodes(barcodes, verbose):
+def encode_form(barcodes, settings, hostname):
+    form_data = [
+        (settings.HOSTNAME_VAR or "hostname", hostname),
+    ]
+    for info in barcodes:
+        form_data.append((settings.BARCODE_VAR or "barcode", info.barcode))
+
+    return form_data, {}
+
+
+def encode_json(barcodes, settings, hostname):
+    body = dumps(
+        {
+            settings.HOSTNAME_VAR or "hostname": hostname,
+            settings.BARCODE_VAR or "barcode": [info.barcode for info in barcodes],
+        }
+    ).encode()
+
+    return body, {"Content-Type": "application/json"}
+
+
+def encode_gzip(barcodes, settings, hostname):
+    body, headers = encode_json(barcodes, settings, hostname)
+
+    return gzip.compress(body), {**headers, "Content-Encoding": "gzip"}
+
+
+def parse_form_status(status, barcodes):
+    return {
+        info.barcode: status
+        if not isinstance(status, dict) or status.get(info.barcode) is None
+        else status[info.barcode]
+        for info in barcodes
+    }
+
+
+def parse_json_status(status, barcodes):
+    # the json body carries the barcodes as an array, so the server can answer
+    # with an array of statuses in the same order
+    if isinstance(status, list):
+        return {
+            info.barcode: status[i]
+            if i < len(status) and status[i] is not None
+            else "MissingStatus"
+            for i, info in enumerate(barcodes)
+        }
+    return parse_form_status(status, barcodes)
+
+
+FORMATS = {
+    "form": (encode_form, parse_form_status),
+    "json": (encode_json, parse_json_status),
+    "gzip": (encode_gzip, parse_json_status),
+}
+
+
+def retry_after(response, default=None):
+    """
+    Seconds to wait from a Retry-After header, given either in seconds or
+    as an HTTP date.
+    """
+    value = response.headers.get("Retry-After", "").strip()
+
+    if value.isdigit():
+        return int(value)
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+
+    return max(0, date.timestamp() - time.time())
+
+
+def record_failure(endpoint, verbose=False):
+    """
+    Shrink the batch and count a failure on the breaker of the endpoint,
+    pausing the endpoint for 2, 4... seconds until the breaker opens.
+    """
+    breaker = endpoint.breaker
+
+    endpoint.batch.failure()
+
+    if verbose:
+        print(f"📦 Endpoint {endpoint.name}: {endpoint.batch.metrics()}")
+
+    was_open = breaker.is_open
+    interval = breaker.failure()
+
+    if breaker.is_open:
+        if not was_open:
+            print(f"🔌 {endpoint.settings.URL} is offline after {breaker.failures} failures")
+        print(f"🔌 Next probe in {interval} seconds")
+    else:
+        # not offline yet, but the records are not sent again right away
+        endpoint.retry_at = max(
+            endpoint.retry_at, time.monotonic() + jitter(2**breaker.failures)
+        )
+
+
+async def handle_remote_barcodes(endpoint, barcodes, verbose):
     # API endpoint details
-    settings = await get_settings()
+    settings = endpoint.settings
+    breaker = endpoint.breaker
 
     hostname = get_hostname()
 
     url = f"{settings.URL}"
 
-    # Build form data
-    form_data = [
-        (settings.HOSTNAME_VAR or "hostname", hostname),
-    ]
-    for info in barcodes:
-        form_data.append((settings.BARCODE_VAR or "barcode", info.barcode))
+    if breaker.state == HALF_OPEN:
+        print(f"🔌 Probing {url} after {breaker.failures} failures...")
+
+    payload_format = settings.FORMAT in FORMATS and settings.FORMAT or "form"
+
+    encode, parse_status = FORMATS[payload_format]
+
+    body, headers = encode(barcodes, settings, hostname)
+
+    if settings.TOKEN:
+        headers["Authorization"] = f"Bearer {settings.TOKEN}"
 
-    print(f"📤 Sending {len(barcodes)} barcodes to {url}...")
+    print(f"📤 Sending {len(barcodes)} barcodes to {url} as {payload_format}...")
 
     if verbose:
 
         for info in barcodes:
             print(f"📤 Sent barcode: {info.barcode}")
 
-    ssl_context = ssl.create_default_context()
-
-    if bool(settings.INSECURE):
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE  # Disable cert verification
+    started = time.monotonic()
 
     # Send the request asynchronously
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(
-                url,
-                data=form_data,
-                headers=(
-                    {
-                        "Authorization": f"Bearer {settings.TOKEN}",
-                    }
-                    if settings.TOKEN
-                    else None
-                ),
-                ssl=ssl_context,
-            ) as response:
-
-                status = await attempt_status_parse(response, settings, verbose=verbose)
-
-                if response.status == 200 and status:
-                    print(f"✅ Successfully sent {len(barcodes)} barcodes")
-
-                    ensure_future(flash_green())
-
-                    return {
-                        info.barcode: isinstance(status, dict)
-                        and status.get(info.barcode)
-                        or status
-                        for info in barcodes
-                    }
+    try:
+        session = await endpoint.get_session()
+
+        async with session.post(
+            url,
+            data=body,
+            headers=headers or None,
+        ) as response:
+
+            response_bytes = len(await response.read())
+
+            status = await attempt_status_parse(response, settings, verbose=verbose)
+
+            if response.status == 429 or response.status >= 500:
+                if delay := retry_after(
+                    response, default=response.status == 429 and 10 or None
+                ):
+                    print(f"⏳ {url} asked to retry in {delay:.0f} seconds")
+                    endpoint.retry_at = time.monotonic() + jitter(delay)
+
+            if response.status == 429:
+                # the server is up but overloaded, keep the barcodes pending
+                return {}
+
+            if response.status >= 500:
+                raise aiohttp.ClientResponseError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                    message=response.reason,
+                )
+
+            if response.status == 413:
+                # too large a batch, the server is up: keep the barcodes
+                # pending and send them again in smaller batches, unless
+                # the batch cannot shrink any further
+                endpoint.batch.failure()
+
+                if len(barcodes) > endpoint.batch.minimum:
+                    if verbose:
+                        print(f"📦 Endpoint {endpoint.name}: {endpoint.batch.metrics()}")
 
-                ensure_future(flash_red())
+                    return {}
+            else:
+                endpoint.batch.success(
+                    len(barcodes), time.monotonic() - started, response_bytes
+                )
 
-                return {
-                    info.barcode: status or f"HTTPError{response.status}"
-                    for info in barcodes
-                }
-        except (
-            aiohttp.client_exceptions.ClientConnectorError,
-            aiohttp.client_exceptions.InvalidUrlClientError,
-        ) as e:
             if verbose:
-                print(f"⚠️ Error sending barcodes: {e}")
+                print(f"📦 Endpoint {endpoint.name}: {endpoint.batch.metrics()}")
 
-            return {info.barcode: e.__class__.__name__ for info in barcodes}
+            if response.status == 200 and status:
+                print(f"✅ Successfully sent {len(barcodes)} barcodes")
+
+                ensure_future(flash_green())
+
+                return parse_status(status, barcodes)
+
+            ensure_future(flash_red())
+
+            return {
+                info.barcode: status or f"HTTPError{response.status}"
+                for info in barcodes
+            }
+    except aiohttp.InvalidURL as e:
+        # a missing or broken URL is a setting to fix, not an outage to wait out
+        print(f"⚠️ Invalid URL {url!r} for endpoint {endpoint.name}")
+
+        ensure_future(flash_red())
+
+        return {info.barcode: e.__class__.__name__ for info in barcodes}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if verbose:
+            print(f"⚠️ Error sending barcodes: {e!r}")
+
+        record_failure(endpoint, verbose=verbose)
+
+        # the endpoint is unreachable, keep the barcodes pending for a retry
+        return {}
 
 
 async def handle_settings_barcodes(barcodes, verbose=False, **opts):
@@ -126,11 +279,29 @@ async def handle_settings_barcodes(barcodes, verbose=False, **opts):
 
         else:
 
-            result[info.barcode] = "SettingsChanged"
+            changes = {}
 
             for k, values in parse_qs(parsed.query, keep_blank_values=True).items():
                 for v in values:
-                    settings[k] = v
+                    changes[k] = v
+
+            try:
+                # performance knobs must parse and be in range, or nothing applies
+                for k, v in changes.items():
+                    if k in TUNABLES:
+                        parse_tunable(k, v)
+            except ValueError as e:
+                print(f"⚠️ Invalid setting in {info.barcode}: {e}")
+
+                result[info.barcode] = "InvalidSetting"
+
+                ensure_future(flash_red())
+
+                continue
+
+            result[info.barcode] = "SettingsChanged"
+
+            settings.update(changes)
 
     if settings:
 
@@ -151,48 +322,262 @@ async def handle_invalid_barcodes(barcodes, **opts):
     return {info.barcode: "InvalidBarcode" for info in barcodes}
 
 
-matchers = (
-    (
-        re.compile(r"piscanner://.*"),
-        handle_settings_barcodes,
-    ),
-    (re.compile("[0-9]+X.*"), handle_remote_barcodes),
-)
+matchers = ((re.compile(r"piscanner://.*"), handle_settings_barcodes),)
 
 
-async def start_sender(sleep_duration=5, verbose=False, **opts):
+def match_barcode(barcode, verbose=False):
+    """
+    Find what handles a barcode: a local handler from `matchers`, or the
+    first endpoint whose pattern matches.
+
+    Returns:
+        tuple: (handler or endpoint, named groups of the match)
+    """
+    for compiled, func in matchers:
+        if match := compiled.match(barcode):
+            if verbose:
+                print(f"🧑🏼‍🔬 Matched barcode {barcode} with function {func.__name__}")
+            return func, match.groupdict()
+
+    for endpoint in endpoints.values():
+        if match := endpoint.match(barcode):
+            if verbose:
+                print(f"🧑🏼‍🔬 Matched barcode {barcode} with endpoint {endpoint.name}")
+            return endpoint, match.groupdict()
+
+    if verbose:
+        print(f"🧑🏼‍🔬 Invalid barcode {barcode}")
+
+    return handle_invalid_barcodes, {}
+
+
+async def send_batch(endpoint, batch, verbose=False):
+    """
+    Send a batch of {barcode: [record_ids]} to the endpoint and store the
+    statuses. Records without a status stay queued for the next attempt.
+
+    Any other error is counted as a failure of the endpoint, so the records
+    are retried after the breaker backoff instead of right away.
+    """
+    try:
+        results = await handle_remote_barcodes(
+            endpoint, [data(barcode=barcode) for barcode in batch], verbose=verbose
+        )
+
+        final_data = defaultdict(list)
+
+        for barcode, status in results.items():
+            # servers may answer anything as a status, it is stored as text
+            final_data[str(status)].extend(batch[barcode])
+
+        await set_status_mapping(final_data)
+
+        for barcode in results:
+            for id in batch[barcode]:
+                endpoint.queue.pop(id, None)
+
+        # only once the statuses are stored, a failure to store them must
+        # still back off
+        if results:
+            endpoint.breaker.success()
+    except Exception:
+        print(f"⚠️ Failed to send a batch to endpoint {endpoint.name}:")
+        traceback.print_exc()
+
+        record_failure(endpoint, verbose=verbose)
+    finally:
+        endpoint.done(id for ids in batch.values() for id in ids)
+
+
+def log_failure(task):
+    if not task.cancelled() and task.exception():
+        print(f"Task {task} failed with exception:")
+        traceback.print_exception(task.exception())
+
+
+async def start_endpoint(endpoint, verbose=False):
+    """
+    Drain the endpoint queue, running up to `concurrency` batches at a time
+    within the endpoint rate limits. While the breaker is open nothing is sent
+    until the next probe is due, probes are sent one at a time with a single
+    barcode. A Retry-After from the server pauses the endpoint.
+    """
+    semaphore = asyncio.Semaphore(endpoint.concurrency)
 
     while True:
+        await semaphore.acquire()
+
+        state = endpoint.breaker.state
+
+        if state == OPEN:
+            semaphore.release()
+            await asyncio.sleep(endpoint.breaker.probe_at - time.monotonic())
+            continue
+
+        if (wait := endpoint.retry_at - time.monotonic()) > 0:
+            semaphore.release()
+            await asyncio.sleep(wait)
+            continue
+
+        batch = endpoint.next_batch(state == CLOSED and endpoint.batch.size or 1)
+
+        if not batch:
+            semaphore.release()
+            endpoint.wakeup.clear()
+            await endpoint.wakeup.wait()
+            continue
+
+        await endpoint.request_rate.acquire()
+        await endpoint.barcode_rate.acquire(len(batch))
+
+        task = asyncio.create_task(send_batch(endpoint, batch, verbose=verbose))
+        endpoint.tasks.add(task)
+        task.add_done_callback(endpoint.tasks.discard)
+        task.add_done_callback(lambda task: semaphore.release())
+        task.add_done_callback(log_failure)
+
+        if state == HALF_OPEN:
+            # the next probe waits for this one, which outlives this loop
+            # being cancelled like any batch in flight
+            await asyncio.shield(task)
+
+
+async def update_endpoints(settings, verbose=False):
+    """
+    Rebuild the endpoints when their settings changed.
+
+    Returns:
+        bool: True when the endpoints were rebuilt
+    """
+    configs = endpoint_settings(settings)
+
+    if configs == {name: endpoint.settings for name, endpoint in endpoints.items()}:
+        return False
+
+    for endpoint in endpoints.values():
+        await endpoint.close()
+
+    endpoints.clear()
+
+    for name, config in configs.items():
+        if verbose:
+            print(f"🔌 Starting endpoint {name} for {config.URL or '(no url)'}")
+
+        endpoint = endpoints[name] = Endpoint(name, config)
+        endpoint.task = asyncio.create_task(start_endpoint(endpoint, verbose=verbose))
+        endpoint.task.add_done_callback(log_failure)
+
+    return True
+
+
+async def catch_up(endpoint, last_id, limit, verbose=False):
+    """
+    Queue the records left in the database while the endpoint could not take
+    more, up to `last_id` which the sender already went past, at most `limit`
+    records read at a time.
+    """
+    start, endpoint.behind = endpoint.behind, None
+
+    records = {}
+    read_to = start - 1
+    count = 0
+
+    async for record in read(limit=limit, not_uploaded_only=True, after_id=start - 1):
+        count += 1
+
+        if record.id > last_id or endpoint.behind is not None:
+            continue
+
+        read_to = record.id
+
+        if match_barcode(record.barcode)[0] is not endpoint:
+            continue
+
+        if not endpoint.accepts(len(records)):
+            endpoint.behind = record.id
+            continue
+
+        records[record.id] = record.barcode
+
+    if endpoint.behind is None and count >= limit and read_to < last_id:
+        # a full page, more records may be left
+        endpoint.behind = read_to + 1
+
+    if verbose:
+        print(f"🔌 Endpoint {endpoint.name} caught up {len(records)} records")
+
+    if records:
+        endpoint.enqueue(records)
+
+
+async def start_sender(
+    sleep_duration=None, limit=None, verbose=False, after_id=0, settings=None, **opts
+):
+
+    # pending records are read once in id order and handed to the endpoint
+    # queues, each endpoint drains its own queue independently, records up to
+    # `after_id` are left alone. An endpoint that is offline or has a full
+    # queue gets nothing more, it catches up from the database later.
+    last_id = after_id
+
+    # stations powered on together should not all start uploading at once
+    interval = sleep_duration
+
+    if interval is None:
+        interval = (await get_tuning()).SENDER_INTERVAL
+
+    await asyncio.sleep(random.uniform(0, interval))
+
+    while True:
+
+        # explicit `settings` replace the stored ones, without touching them
+        if await update_endpoints(settings or await get_settings(), verbose=verbose):
+            # queues are fresh, so everything pending needs to be dispatched again
+            last_id = after_id
+
+        # SENDER_INTERVAL and SENDER_LIMIT unless given explicitly
+        tuning = await get_tuning()
+        interval = tuning.SENDER_INTERVAL if sleep_duration is None else sleep_duration
+        batch_limit = tuning.SENDER_LIMIT if limit is None else limit
+
+        for endpoint in endpoints.values():
+            if endpoint.behind is not None and endpoint.accepts():
+                await catch_up(endpoint, last_id, batch_limit, verbose=verbose)
+
         # Collect unsent records
         records = {}
-        async for record in read(limit=100, not_uploaded_only=True):
+        async for record in read(
+            limit=batch_limit, not_uploaded_only=True, after_id=last_id
+        ):
             records[record.id] = record.barcode
+            last_id = record.id
 
         if records:
-            groups = defaultdict(list)
+            groups = defaultdict(dict)
+            queued = defaultdict(dict)
 
             barcodes = {}
 
-            for r in frozenset(records.values()):
+            for id, r in records.items():
 
-                match = None
+                target, groupdict = match_barcode(r, verbose=verbose)
 
-                for compiled, func in matchers:
-                    if match := compiled.match(r):
-                        if verbose:
-                            print(
-                                f"🧑🏼‍🔬 Matched barcode {r} with function {func.__name__}"
-                            )
-                        groups[func].append(data(barcode=r, **match.groupdict()))
-                        break
+                if isinstance(target, Endpoint):
+                    if target.behind is None and not target.accepts(
+                        len(queued[target])
+                    ):
+                        target.behind = id
 
-                if not match:
-                    if verbose:
-                        print(f"🧑🏼‍🔬 Invalid barcode {r}")
-                    groups[handle_invalid_barcodes].append(data(barcode=r))
+                    if target.behind is None:
+                        queued[target][id] = r
+                else:
+                    groups[target][r] = data(barcode=r, **groupdict)
+
+            for endpoint, items in queued.items():
+                endpoint.enqueue(items)
 
             for func, items in groups.items():
-                results = await func(items, verbose=verbose, **opts)
+                results = await func(list(items.values()), verbose=verbose, **opts)
 
                 for barcode, status in results.items():
                     barcodes[barcode] = status
@@ -200,12 +585,14 @@ async def start_sender(sleep_duration=5, verbose=False, **opts):
             final_data = defaultdict(list)
 
             for id, barcode in records.items():
-                status = barcodes[barcode]
-                final_data[status].append(id)
+                if barcode in barcodes:
+                    final_data[barcodes[barcode]].append(id)
 
             await set_status_mapping(final_data)
 
-        await asyncio.sleep(sleep_duration)
+        # keep reading without waiting while there is a backlog
+        if len(records) < batch_limit:
+            await asyncio.sleep(jitter(interval))
 
 
 def sender_coroutines(*args, **opts):
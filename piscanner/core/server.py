@@ -1,5 +1,5 @@
 import asyncio
-import datetime
+import hashlib
 import logging
 import os
 import sys
@@ -8,15 +8,30 @@ from urllib.parse import urlparse
 
 from aiohttp import web
 
-import piscanner
+from piscanner.core.assets import etag_matches, serve_main_app, serve_static
+from piscanner.core.devices import device_metrics
+from piscanner.core.endpoints import endpoint_metrics
+from piscanner.core.logs import LOGS_PATH, tail_log
+from piscanner.utils.datastructures import data
+from piscanner.utils.json import dumps
 from piscanner.utils.machine import get_hostname, get_local_hostname
-from piscanner.utils.storage import get_settings, read
-
-
-def format_date(dt):
-    """Format datetime object or return long dash if None."""
-    if dt:
-        return dt.strftime("%Y-%m-%d %H:%M:%S")
+from piscanner.utils.functions import to_int
+from piscanner.utils.storage import (
+    get_loop_stats,
+    get_settings,
+    get_stats,
+    get_summary,
+    read_recent,
+    timestamp,
+    timestamp_to_datetime,
+)
+from piscanner.utils.watchdog import watchdog
+
+
+def format_date(t):
+    """Format a millisecond timestamp in local time or return long dash if None."""
+    if t:
+        return timestamp_to_datetime(t).strftime("%Y-%m-%d %H:%M:%S")
     return "&mdash;"
 
 
@@ -27,14 +42,15 @@ def is_success(status):
 
 def is_recent(created_timestamp, seconds=10):
     """Check if barcode was created within the last N seconds."""
-    now = datetime.datetime.now(created_timestamp.tzinfo)
-    return (now - created_timestamp).total_seconds() <= seconds
+    return timestamp() - created_timestamp <= seconds * 1000
 
 
 def format_value(key, value):
+    # endpoint settings are prefixed with the endpoint name, e.g. inventory.TOKEN
+    key = key.rpartition(".")[2]
     if key == "TOKEN" and value:
         return "".join(repeat("&bull;", 8))
-    if key == "INSECURE":
+    if key in ("INSECURE", "JOURNAL"):
         return bool(value) and "&#x2713;" or "&mdash;"
     if key == "URL" and value and (netloc := urlparse(value).netloc or value):
         return f"<a target='_blank' href='{value}'>{netloc}</a>"
@@ -50,11 +66,14 @@ async def refresh_data(request):
 
     # Collect barcodes data
     barcodes_data = []
-    async for row in read():
+    last_scan = None
+
+    async for row in read_recent():
         barcode_entry = {
             "id": row.id,
             "barcode": row.barcode,
             "status": row.status,
+            "device": row.device,
             "created_timestamp": format_date(row.created_timestamp),
             "completed_timestamp": format_date(row.completed_timestamp),
             "is_success": is_success(row.status),
@@ -64,14 +83,60 @@ async def refresh_data(request):
         }
         barcodes_data.append(barcode_entry)
 
-    return web.json_response(
+        last_scan = last_scan or row.created_timestamp
+
+    # counts cover the whole table, kept by triggers instead of scanning it
+    counts = await get_summary()
+
+    summary = {
+        "total": counts.total,
+        "pending": counts.pending,
+        "errors": sum(
+            count
+            for status, count in counts.statuses.items()
+            if not is_success(status)
+        ),
+        "last_scan": timestamp_to_datetime(last_scan),
+    }
+
+    body = dumps(
         {
             "hostname": get_hostname(),
             "settings": settings_data,
             "barcodes": barcodes_data,
+            "summary": summary,
+            # only filled when the sender runs in the same process
+            "endpoints": endpoint_metrics(),
+            # only filled when the listener runs in the same process
+            "devices": device_metrics(),
         }
     )
 
+    # lets pollers (dashboard, fleet) skip unchanged payloads
+    etag = hashlib.sha1(body.encode()).hexdigest()[:32]
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+
+    if etag_matches(request.headers.get("If-None-Match", ""), etag):
+        return web.Response(status=304, headers=headers)
+
+    return web.Response(text=body, content_type="application/json", headers=headers)
+
+
+async def stats_data(request):
+    seconds = to_int(request.query.get("seconds"), 3600)
+
+    return web.json_response(await get_stats(seconds=seconds))
+
+
+async def debug_loop(request):
+    """
+    Stalls of the event loop of this process, with the blocking stacks, and
+    the ones last stored by every process running the watchdog.
+    """
+    return web.json_response(
+        data(watchdog.metrics(), processes=await get_loop_stats())
+    )
+
 
 async def start_server(address="0.0.0.0", port=9999, verbose=False):
 
@@ -85,24 +150,16 @@ async def start_server(address="0.0.0.0", port=9999, verbose=False):
 
     app = web.Application()
 
-    static_path = os.path.abspath(
-        os.path.join(os.path.dirname(piscanner.__file__), "static")
-    )
-
-    logs_path = os.path.expanduser("~/logs")
-
-    # Serve Preact app for main route
-    async def serve_main_app(request):
-        return web.FileResponse(os.path.join(static_path, "index.html"))
-
+    # Serve Preact app for main route, static files are served from memory
     app.router.add_get("/", serve_main_app)
+    app.router.add_get("/static/{name}", serve_static, name="static")
     app.router.add_get("/refresh/", refresh_data)
+    app.router.add_get("/stats/", stats_data)
+    app.router.add_get("/debug/loop/", debug_loop)
 
-    if os.path.exists(logs_path):
-        app.router.add_static('/logs/', logs_path, name='logs', show_index=True)
-
-    # Add static file serving for /static/ route
-    # app.router.add_static('/static/', static_path, name='static')
+    if os.path.exists(LOGS_PATH):
+        app.router.add_get("/logs/tail/{name}", tail_log, name="tail")
+        app.router.add_static('/logs/', LOGS_PATH, name='logs', show_index=True)
 
     runner = web.AppRunner(app)
     await runner.setup()
@@ -0,0 +1,62 @@
+class AdaptiveBatch:
+    """
+    Batch size adjusted from the measured upload latency (AIMD).
+
+    A full batch answered within `target` seconds grows the size by `step`
+    as long as the projected latency stays within target. A slower answer
+    shrinks it proportionally to how much it went over, a failure halves it.
+    The size always stays between `minimum` and `maximum`.
+
+    Usage:
+        batch = AdaptiveBatch(size=100)
+        ...send batch.size barcodes...
+        batch.success(count, rtt, response_bytes)  # or batch.failure()
+    """
+
+    def __init__(self, size=100, minimum=10, maximum=1000, target=5, alpha=0.3):
+        self.minimum = min(minimum, maximum)
+        self.maximum = maximum
+        self.target = target
+        self.alpha = alpha
+        self.step = max(1, self.maximum // 20)
+        self.size = self.clamp(size)
+
+        # moving averages, for reporting
+        self.rtt = None
+        self.response_bytes = None
+        self.error_rate = 0.0
+
+    def clamp(self, size):
+        return max(self.minimum, min(self.maximum, int(size)))
+
+    def average(self, previous, value):
+        if previous is None:
+            return value
+        return previous + self.alpha * (value - previous)
+
+    def success(self, count, rtt, response_bytes=0):
+        self.rtt = self.average(self.rtt, rtt)
+        self.response_bytes = self.average(self.response_bytes, response_bytes)
+        self.error_rate = self.average(self.error_rate, 0)
+
+        if rtt > self.target:
+            self.size = self.clamp(self.size * self.target / rtt)
+        elif count >= self.size and rtt * (self.size + self.step) / count <= self.target:
+            # only a full batch tells how a bigger one would do
+            self.size = self.clamp(self.size + self.step)
+
+        return self.size
+
+    def failure(self):
+        self.error_rate = self.average(self.error_rate, 1)
+        self.size = self.clamp(self.size // 2)
+
+        return self.size
+
+    def metrics(self):
+        return {
+            "batch_size": self.size,
+            "rtt": self.rtt and round(self.rtt, 3),
+            "response_bytes": self.response_bytes and round(self.response_bytes),
+            "error_rate": round(self.error_rate, 3),
+        }
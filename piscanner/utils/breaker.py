@@ -0,0 +1,66 @@
+import time
+
+from piscanner.utils.functions import jitter
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Track consecutive failures of a remote endpoint.
+
+    After `threshold` consecutive failures the breaker opens and no request
+    should be attempted until the next probe is due. Probe intervals start at
+    `min_interval` seconds and double after every failed probe, up to
+    `max_interval`, with some jitter so a fleet does not probe in lockstep.
+    A single success closes the breaker again.
+
+    Usage:
+        if breaker.state == OPEN:
+            return
+        try:
+            ...
+        except Exception:
+            breaker.failure()
+        else:
+            breaker.success()
+    """
+
+    def __init__(self, threshold=3, min_interval=5, max_interval=300):
+        self.threshold = threshold
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.reset()
+
+    def reset(self):
+        self.failures = 0
+        self.interval = 0
+        self.probe_at = 0
+
+    @property
+    def is_open(self):
+        return self.failures >= self.threshold
+
+    @property
+    def state(self):
+        if not self.is_open:
+            return CLOSED
+        if time.monotonic() >= self.probe_at:
+            return HALF_OPEN
+        return OPEN
+
+    def success(self):
+        self.reset()
+
+    def failure(self):
+        self.failures += 1
+
+        if self.is_open:
+            self.interval = min(
+                self.interval * 2 or self.min_interval, self.max_interval
+            )
+            self.probe_at = time.monotonic() + jitter(self.interval)
+
+        return self.interval
@@ -1,2 +1,26 @@
+import random
+
+
 def identity(value):
     return value
+
+
+def to_int(value, default, minimum=1):
+    """Parse a setting as an integer, falling back to default when invalid."""
+    try:
+        return max(int(value), minimum)
+    except (TypeError, ValueError):
+        return default
+
+
+def to_float(value, default, minimum=0):
+    """Parse a setting as a float, falling back to default when invalid."""
+    try:
+        return max(float(value), minimum)
+    except (TypeError, ValueError):
+        return default
+
+
+def jitter(seconds, ratio=0.2):
+    """Randomize a delay by +/- ratio, so stations do not act in lockstep."""
+    return seconds * random.uniform(1 - ratio, 1 + ratio)
@@ -0,0 +1,226 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+# payload length, crc32, sequence, created timestamp (ms), a zero length
+# marks the end of the written records
+HEADER = struct.Struct("<HIqq")
+
+# the payload is the barcode, preceded by the device and this separator
+DEVICE_SEPARATOR = "\0"
+
+MAX_PAYLOAD = 0xFFFF
+
+
+class Journal:
+    """
+    Append-only file of scans, preallocated and memory mapped, so capturing a
+    scan is one sequential write instead of B-tree page writes in SQLite.
+
+    Every record carries a checksum and a sequence number that grows by one.
+    Reading stops at the first record that is torn, corrupted or out of
+    sequence, so after a crash the journal is replayed up to the last
+    complete append.
+
+    The file is split in two halves, each holding a chain of records from
+    its start. When the half being appended to is full, appends move to the
+    start of the other half as soon as every record there has been merged,
+    so a steady flow of scans never fills the journal, and records are never
+    moved, so a crash can not tear a record that is not merged yet. Once
+    every record has been merged the journal is rewound to the start.
+
+    Usage:
+        journal.open(merged_sequence)
+        journal.append(barcode, created_timestamp, device)
+        ...
+        records = journal.pending[:]
+        # store records and their last sequence in one transaction
+        journal.merged(records[-1][0])
+    """
+
+    def __init__(self, path, size=4 * 1024 * 1024):
+        self.path = path
+        self.size = size
+        self.map = None
+        self.position = 0
+        self.sequence = 0
+        self.pending = []
+        # sequence -> file offset of the pending records
+        self.offsets = {}
+        # the map is flushed from worker threads while the loop may close it
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.map is not None
+
+    @property
+    def half_size(self):
+        return self.size // 2
+
+    def half_end(self, position):
+        """End of the half holding `position`."""
+        return position < self.half_size and self.half_size or self.size
+
+    def open(self, merged_sequence=0):
+        """
+        Map the journal, creating and preallocating it when missing, and load
+        the records newer than `merged_sequence`.
+
+        Returns:
+            list: (sequence, created timestamp, barcode, device) of unmerged
+            records
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            if os.fstat(fd).st_size < self.size:
+                # real blocks, so appends never wait for the filesystem to allocate
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fd, 0, self.size)
+                else:
+                    os.ftruncate(fd, self.size)
+
+            self.size = os.fstat(fd).st_size
+            self.map = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+        # the chain of the first half may run into the second one, when the
+        # appends moved on to it, the records read twice are the same
+        found = {}
+        ends = {}
+
+        for start in (0, self.half_size):
+            records, offsets, end = self.scan(start)
+
+            for record, offset in zip(records, offsets):
+                found.setdefault(record[0], (record, offset))
+
+            if records:
+                ends[records[-1][0]] = end
+
+        self.pending = [
+            record for sequence, (record, _) in sorted(found.items())
+            if sequence > merged_sequence
+        ]
+        self.offsets = {record[0]: found[record[0]][1] for record in self.pending}
+        self.sequence = max(merged_sequence, found and max(found) or 0)
+
+        # appends continue after the newest record
+        self.position = self.pending and ends[max(ends)] or 0
+
+        return self.pending
+
+    def scan(self, position=0):
+        """
+        Read the consecutive valid records of the chain starting at
+        `position`.
+
+        Returns:
+            tuple: (list of (sequence, created timestamp, barcode, device),
+            list of their offsets, end position)
+        """
+        records = []
+        offsets = []
+
+        while position + HEADER.size <= self.size:
+            length, crc, sequence, created_timestamp = HEADER.unpack_from(
+                self.map, position
+            )
+
+            end = position + HEADER.size + length
+
+            if not length or end > self.size:
+                break
+
+            payload = self.map[position + HEADER.size : end]
+
+            if crc != checksum(sequence, created_timestamp, payload):
+                break
+
+            if records and sequence != records[-1][0] + 1:
+                break
+
+            device, _, barcode = payload.decode().rpartition(DEVICE_SEPARATOR)
+
+            records.append((sequence, created_timestamp, barcode, device or None))
+            offsets.append(position)
+            position = end
+
+        return records, offsets, position
+
+    def append(self, barcode, created_timestamp, device=None):
+        """
+        Write a record into the mapped file.
+
+        Returns:
+            tuple: (offset, length) of the written bytes to `sync`, or None
+            when the journal is full or the barcode does not fit a record
+        """
+        payload = (device and f"{device}{DEVICE_SEPARATOR}{barcode}" or barcode).encode()
+        length = HEADER.size + len(payload)
+
+        if not barcode or len(payload) > MAX_PAYLOAD or length > self.half_size:
+            return None
+
+        if self.position + length > self.half_end(self.position):
+            other = self.position < self.half_size and self.half_size or 0
+
+            # the other half still holds the oldest records to merge
+            if self.pending and (
+                other <= self.offsets[self.pending[0][0]] < self.half_end(other)
+            ):
+                return None
+
+            self.position = other
+
+        sequence = self.sequence + 1
+        offset = self.position
+
+        self.map[offset + HEADER.size : offset + length] = payload
+        HEADER.pack_into(
+            self.map,
+            offset,
+            len(payload),
+            checksum(sequence, created_timestamp, payload),
+            sequence,
+            created_timestamp,
+        )
+
+        self.sequence = sequence
+        self.position += length
+        self.pending.append((sequence, created_timestamp, barcode, device))
+        self.offsets[sequence] = offset
+
+        return offset, length
+
+    def sync(self, offset, length):
+        """Flush the pages holding a record to the card, blocking."""
+        with self.lock:
+            if self.map is None:
+                return
+
+            start = offset - offset % mmap.PAGESIZE
+            self.map.flush(start, offset + length - start)
+
+    def merged(self, sequence):
+        """Forget the records up to `sequence`, rewinding once all are merged."""
+        self.pending = [record for record in self.pending if record[0] > sequence]
+        self.offsets = {record[0]: self.offsets[record[0]] for record in self.pending}
+
+        if not self.pending:
+            self.position = 0
+
+    def close(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.flush()
+                self.map.close()
+                self.map = None
+
+
+def checksum(sequence, created_timestamp, payload):
+    return zlib.crc32(payload, zlib.crc32(struct.pack("<qq", sequence, created_timestamp)))
@@ -1,13 +1,21 @@
 import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
+from piscanner.utils.datastructures import data
 from piscanner.utils.machine import is_mac
+from piscanner.utils.tuning import tuning
 
 # Define pins
 RED_PIN = 2
 YELLOW_PIN = 3
 GREEN_PIN = 4
 
+# pins are only written once set up, processes without lights skip them
+gpio = data(ready=False)
+
+
 def setup_gpio():
 
     if is_mac:
@@ -22,6 +30,8 @@ def setup_gpio():
     for pin in (RED_PIN, GREEN_PIN, YELLOW_PIN):
         GPIO.setup(pin, GPIO.OUT, initial=GPIO.LOW)
 
+    gpio.ready = True
+
 
 def cleanup_gpio():
 
@@ -30,39 +40,139 @@ def cleanup_gpio():
 
     from RPi import GPIO
 
+    gpio.ready = False
     GPIO.cleanup()
 
 
-# The generic async function
-async def control_light(
-    lock,
-    pin: int,
-    duration: float = 0.3,
-    wait: float = 0.2,
-    title="Unknown",
-    verbose=False,
-):
+def write_pins(pins, on):
+
+    if is_mac or not gpio.ready:
+        return
+
+    from RPi import GPIO
+
+    for pin in pins:
+        GPIO.output(pin, on and GPIO.HIGH or GPIO.LOW)
+
+
+class LightScheduler:
+    """
+    Single owner of the GPIO pins.
+
+    Pattern requests go into a small bounded queue that is played in order.
+    A request identical to one already queued replaces it, and when the
+    queue is full the oldest request is dropped, so the lights always catch
+    up with the most recent state. GPIO writes run in a dedicated thread and
+    never block the event loop.
+
+    Usage:
+        await scheduler.request((RED_PIN,), duration=0.3, wait=0.2)
+    """
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self.pending = deque()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpio")
+        self.task = None
+        self.wakeup = None
+
+    def request(self, pins, duration=0.3, wait=0.2, title="Unknown", verbose=False):
+        """
+        Queue a pattern without waiting for it.
 
-    if not is_mac:
-        from RPi import GPIO
+        Returns:
+            Future: resolves to True once the pattern was shown, or to False
+            when it was dropped in favour of a more recent one
+        """
+        loop = asyncio.get_running_loop()
 
-    async with lock:
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.pending.clear()
+            self.wakeup = asyncio.Event()
+            self.task = loop.create_task(self.run())
 
-        if verbose:
-            print(f"💡 Turning ON light {title} on GPIO{pin}")
-        if not is_mac:
-            GPIO.output(pin, GPIO.HIGH)
-        await asyncio.sleep(duration)
+        pattern = (tuple(pins), duration, wait)
 
-        if verbose:
-            print(f"💡 Turning OFF light {title} on GPIO{pin}")
-        if not is_mac:
-            GPIO.output(pin, GPIO.LOW)
-        await asyncio.sleep(wait)
+        # a caller may have been cancelled while waiting, its future is done
+        for queued in tuple(self.pending):
+            if queued.pattern == pattern:
+                self.pending.remove(queued)
+                if not queued.future.done():
+                    queued.future.set_result(False)
 
+        if len(self.pending) >= self.maxsize:
+            dropped = self.pending.popleft()
+            if not dropped.future.done():
+                dropped.future.set_result(False)
 
-flash_green = partial(control_light, pin=GREEN_PIN, lock=asyncio.Lock(), title="Green")
-flash_red = partial(control_light, pin=RED_PIN, lock=asyncio.Lock(), title="Red")
-flash_yellow = partial(
-    control_light, pin=YELLOW_PIN, lock=asyncio.Lock(), title="Yellow"
+        request = data(
+            pattern=pattern, title=title, verbose=verbose, future=loop.create_future()
+        )
+
+        self.pending.append(request)
+        self.wakeup.set()
+
+        return request.future
+
+    async def output(self, request, on):
+        pins, _, _ = request.pattern
+
+        if request.verbose:
+            for pin in pins:
+                print(
+                    f"💡 Turning {on and 'ON' or 'OFF'} light {request.title} on GPIO{pin}"
+                )
+
+        await asyncio.get_running_loop().run_in_executor(
+            self.executor, write_pins, pins, on
+        )
+
+    async def run(self):
+        while True:
+
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            request = self.pending.popleft()
+            _, duration, wait = request.pattern
+
+            try:
+                await self.output(request, True)
+                await asyncio.sleep(duration)
+                await self.output(request, False)
+                await asyncio.sleep(wait)
+            finally:
+                if not request.future.done():
+                    request.future.set_result(True)
+
+
+scheduler = LightScheduler()
+
+
+def control_light(
+    pins,
+    duration: float = None,
+    wait: float = None,
+    title="Unknown",
+    verbose=False,
+):
+    # LIGHT_DURATION and LIGHT_WAIT unless given explicitly
+    return scheduler.request(
+        pins,
+        duration=tuning.LIGHT_DURATION if duration is None else duration,
+        wait=tuning.LIGHT_WAIT if wait is None else wait,
+        title=title,
+        verbose=verbose,
+    )
+
+
+flash_green = partial(control_light, pins=(GREEN_PIN,), title="Green")
+flash_red = partial(control_light, pins=(RED_PIN,), title="Red")
+flash_yellow = partial(control_light, pins=(YELLOW_PIN,), title="Yellow")
+
+# red and yellow together, slower than any other pattern
+flash_offline = partial(
+    control_light, pins=(RED_PIN, YELLOW_PIN), duration=1, wait=1, title="Offline"
 )
@@ -0,0 +1,51 @@
+import atexit
+import queue
+import sys
+import threading
+
+
+class BackgroundWriter:
+    """
+    File-like wrapper handing writes to a thread, so `print` never blocks the
+    event loop on a full pipe or a slow SD card.
+
+    Usage:
+        sys.stdout = BackgroundWriter(sys.stdout)
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name="output", daemon=True)
+        self.thread.start()
+
+        atexit.register(self.close)
+
+    def write(self, text):
+        self.queue.put(text)
+        return len(text)
+
+    def flush(self):
+        self.queue.put(None)
+
+    def run(self):
+        while (text := self.queue.get()) is not StopIteration:
+            if text is None:
+                self.stream.flush()
+            else:
+                self.stream.write(text)
+
+    def close(self):
+        """Write everything still queued, on exit."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.queue.put(StopIteration)
+            self.thread.join(timeout=5)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def write_in_background():
+    if not isinstance(sys.stdout, BackgroundWriter):
+        sys.stdout = BackgroundWriter(sys.stdout)
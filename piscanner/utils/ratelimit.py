@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Client side rate limit of `rate` tokens per second with bursts of up to
+    `burst` tokens. A rate of 0 disables the limit.
+
+    Tokens are taken upfront and the caller sleeps off any debt, so requests
+    larger than the burst still go through, just later.
+
+    Usage:
+        bucket = TokenBucket(rate=2)
+        await bucket.acquire(len(barcodes))
+    """
+
+    def __init__(self, rate=0, burst=None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def acquire(self, tokens=1):
+        if not self.rate:
+            return
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= tokens
+
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
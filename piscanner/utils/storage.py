@@ -1,21 +1,33 @@
 import asyncio
 import datetime
+import functools
+import json
 import os
+import time
+from collections import defaultdict, deque
 from contextlib import asynccontextmanager
 from itertools import repeat
 
 import aiosqlite
 
 from piscanner.utils.datastructures import data
+from piscanner.utils.json import dumps
 from piscanner.utils.machine import is_mac
+from piscanner.utils.tuning import tuning, tuning_from
 
 DB_FILE = "piscanner-001.db"
 
-if is_mac:
+if os.environ.get("PISCANNER_DB"):
+    # must be set before this module is imported, e.g. by the loadtest
+    DB_FILE = os.environ["PISCANNER_DB"]
+elif is_mac:
     DB_FILE = os.path.join(os.path.dirname(__file__), DB_FILE)
 else:
     DB_FILE = os.path.join(os.path.expanduser("~"), DB_FILE)
 
+# rewritten on every settings change, so processes notice it with a stat
+SETTINGS_STAMP = f"{os.path.splitext(DB_FILE)[0]}.settings"
+
 
 @asynccontextmanager
 async def db_transaction(path=DB_FILE, lock=asyncio.Lock()):
@@ -27,13 +39,25 @@ async def db_transaction(path=DB_FILE, lock=asyncio.Lock()):
         async with db_transaction() as db:
             await db.execute("INSERT INTO table VALUES (?)", (value,))
     """
-    async with lock, db_readonly(path=path) as db:
-        try:
-            yield db
-            await db.commit()
-        except Exception as e:
-            await db.rollback()
-            raise e
+    async with lock:
+        async with db_readonly(path=path) as db:
+            try:
+                yield db
+
+                # every commit of every process counts, so the recent window
+                # can tell its own commits from the ones of other processes
+                cursor = await db.execute(
+                    "UPDATE db_generation SET generation = generation + 1 "
+                    "WHERE id = 0 RETURNING generation"
+                )
+                (generation,) = await cursor.fetchone()
+
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                raise e
+
+        recent.track(path, generation)
 
 
 @asynccontextmanager
@@ -52,21 +76,197 @@ async def db_readonly(path=DB_FILE):
         yield db
 
 
+def db_signature(path=DB_FILE):
+    """
+    Cheap fingerprint of the database files, changing on every commit.
+
+    Only file metadata is read, so this never touches the SD card.
+    """
+    return tuple(file_signature(name) for name in (path, f"{path}-wal"))
+
+
+async def get_generation(path=DB_FILE):
+    """
+    Returns:
+        int: Number of transactions committed to the database
+    """
+    async with db_readonly(path=path) as db:
+        cursor = await db.execute("SELECT generation FROM db_generation WHERE id = 0")
+        row = await cursor.fetchone()
+
+    return row and row[0] or 0
+
+
+def write_stamp(path, value):
+    with open(path, "w") as f:
+        f.write(value)
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class RecentRows:
+    """
+    Fixed-size window of the most recent barcode rows, newest first.
+
+    Rows written by this process are applied in memory. Writes from other
+    processes (see `piscanner start --supervise`) trigger a reload, as does
+    a window older than `max_age` seconds.
+
+    A change of `db_signature` only tells that something was written. The
+    window then compares the committed generation with the one it followed:
+    they only match when every commit since the last load was its own.
+    """
+
+    def __init__(self, path=DB_FILE, size=50, max_age=60):
+        self.path = path
+        self.size = size
+        self.max_age = max_age
+        self.rows = deque()
+        self.index = {}
+        self.signature = None
+        self.generation = None
+        self.synced_at = None
+
+    def track(self, path, generation):
+        # only follow our own commit when nobody else committed in between
+        if path != self.path or self.generation is None:
+            return
+
+        if generation == self.generation + 1:
+            self.generation = generation
+        else:
+            self.generation = None
+
+    def is_expired(self):
+        return (
+            self.synced_at is None
+            or self.generation is None
+            or time.monotonic() - self.synced_at > self.max_age
+        )
+
+    async def is_current(self):
+        signature = db_signature(self.path)
+
+        if signature == self.signature:
+            return True
+
+        # signed before reading, so a later commit changes the signature again
+        if await get_generation(self.path) == self.generation:
+            self.signature = signature
+            return True
+
+        return False
+
+    async def load(self):
+        # commits made while reading must not be tracked as applied
+        self.generation = None
+
+        signature = db_signature(self.path)
+        generation = await get_generation(self.path)
+
+        rows = [row async for row in read(limit=self.size)]
+
+        self.rows = deque(rows)
+        self.index = {row.id: row for row in rows}
+        self.signature = signature
+        self.generation = generation
+        self.synced_at = time.monotonic()
+
+    async def get(self, limit):
+        if self.is_expired() or not await self.is_current():
+            await self.load()
+
+        for i, row in enumerate(self.rows):
+            if i >= limit:
+                break
+            yield row
+
+    def insert(self, row):
+        self.rows.appendleft(row)
+        self.index[row.id] = row
+
+        while len(self.rows) > self.size:
+            del self.index[self.rows.pop().id]
+
+    def update(self, ids, **values):
+        for id in ids:
+            if row := self.index.get(id):
+                row.update(values)
+
+    def invalidate(self):
+        self.synced_at = None
+
+    def delete_before(self, created_timestamp):
+        while self.rows and self.rows[-1].created_timestamp < created_timestamp:
+            del self.index[self.rows.pop().id]
+
+
+@functools.lru_cache(maxsize=64)
+def utc_offset(hour):
+    """
+    Local UTC offset for an hour since the epoch. Offsets only change on hour
+    boundaries (DST), so a handful of cached hours covers every row displayed.
+    """
+    return (
+        datetime.datetime.fromtimestamp(hour * 3600, tz=datetime.UTC)
+        .astimezone()
+        .utcoffset()
+    )
+
+
 def timestamp_to_datetime(t):
     """
     Convert a UTC timestamp to a datetime in the local timezone.
 
+    Rows keep the integer timestamps, call this only when displaying them.
+
     Args:
-        t: UTC timestamp stored in the database
+        t: UTC timestamp in milliseconds stored in the database
 
     Returns:
         datetime: Datetime object in local timezone
     """
     if t:
-        # Convert UTC timestamp to datetime with local timezone
+        offset = utc_offset(t // 3_600_000)
         return datetime.datetime.fromtimestamp(
-            t, tz=datetime.UTC
-        ).astimezone()  # Convert to local timezone
+            t / 1000, tz=datetime.timezone(offset)
+        )
+
+
+class Clock:
+    """
+    Millisecond UTC clock anchored to the monotonic clock.
+
+    The anchor is refreshed every `resync` seconds, so a wall clock set late
+    by NTP (the Pi has no RTC) is picked up without jumping backwards within
+    a resync period.
+    """
+
+    def __init__(self, resync=60):
+        self.resync_ns = resync * 1_000_000_000
+        self.anchor()
+
+    def anchor(self):
+        self.monotonic_ns = time.monotonic_ns()
+        self.wall_ms = time.time_ns() // 1_000_000
+
+    def __call__(self):
+        elapsed_ns = time.monotonic_ns() - self.monotonic_ns
+
+        if elapsed_ns > self.resync_ns:
+            self.anchor()
+            elapsed_ns = 0
+
+        return self.wall_ms + elapsed_ns // 1_000_000
+
+
+now_ms = Clock()
 
 
 def timestamp(seconds=0):
@@ -77,44 +277,330 @@ def timestamp(seconds=0):
         seconds: Number of seconds to subtract from current time
 
     Returns:
-        float: UTC timestamp
+        int: UTC timestamp in milliseconds
     """
-    # Get current UTC timestamp
-    return datetime.datetime.now(datetime.UTC).timestamp() - seconds
+    return now_ms() - int(seconds * 1000)
 
 
 async def init():
     async with db_transaction() as db:
+        # WAL lets the listener keep writing while other processes read or upload
+        await db.execute("PRAGMA journal_mode=WAL")
         await db.executescript(
             """
             CREATE TABLE IF NOT EXISTS barcodes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 barcode TEXT NOT NULL,
-                created_timestamp REAL NOT NULL,
-                completed_timestamp REAL,
-                status TEXT NOT NULL DEFAULT 'Scanned'
+                created_timestamp INTEGER NOT NULL,
+                completed_timestamp INTEGER,
+                status TEXT NOT NULL DEFAULT 'Scanned',
+                device TEXT
             );
 
             CREATE TABLE IF NOT EXISTS settings (
                 key TEXT PRIMARY KEY NOT NULL,
                 value TEXT NOT NULL,
-                created_timestamp REAL NOT NULL
+                created_timestamp INTEGER NOT NULL
+            );
+
+            -- last scan journal record merged into barcodes
+            CREATE TABLE IF NOT EXISTS journal_state (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                sequence INTEGER NOT NULL
+            );
+
+            -- transactions committed, see RecentRows
+            CREATE TABLE IF NOT EXISTS db_generation (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                generation INTEGER NOT NULL
+            );
+
+            INSERT OR IGNORE INTO db_generation VALUES (0, 0);
+
+            -- event loop watchdog metrics of each running process
+            CREATE TABLE IF NOT EXISTS loop_stats (
+                process TEXT PRIMARY KEY NOT NULL,
+                pid INTEGER NOT NULL,
+                metrics TEXT NOT NULL,
+                updated_timestamp INTEGER NOT NULL
             );
             """
         )
 
+        cursor = await db.execute(
+            "SELECT type FROM pragma_table_info('barcodes') WHERE name = 'created_timestamp'"
+        )
+        (column_type,) = await cursor.fetchone()
+
+        if column_type == "REAL":
+            await migrate_real_timestamps(db)
+
+        cursor = await db.execute(
+            "SELECT 1 FROM pragma_table_info('barcodes') WHERE name = 'device'"
+        )
+
+        if not await cursor.fetchone():
+            # the scanner that produced the row, unknown for older rows
+            await db.execute("ALTER TABLE barcodes ADD COLUMN device TEXT")
+
+        await db.executescript(
+            """
+            -- covers every column read by the stats, so they never touch
+            -- the table, and replaces the plain created_timestamp index
+            CREATE INDEX IF NOT EXISTS barcodes_created_covering
+                ON barcodes (created_timestamp, completed_timestamp, status, device);
+
+            DROP INDEX IF EXISTS barcodes_created_timestamp;
+
+            -- only pending rows, kept small by the sender
+            CREATE INDEX IF NOT EXISTS barcodes_pending
+                ON barcodes (id) WHERE completed_timestamp IS NULL;
+            """
+        )
+
+        await create_counters(db)
 
-async def insert_barcode(barcode: str, status: str = "Scanned"):
+
+async def create_counters(db):
+    """
+    Keep row counts per hour, status and pending state in barcode_counts,
+    maintained by triggers in the same transaction as every change, so
+    summaries never scan the barcodes table. Existing rows are counted once
+    when the table is created.
+    """
+    cursor = await db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'barcode_counts'"
+    )
+    exists = await cursor.fetchone()
+
+    await db.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS barcode_counts (
+            hour INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            pending INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (hour, status, pending)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS barcode_counts_insert
+        AFTER INSERT ON barcodes
+        BEGIN
+            INSERT INTO barcode_counts VALUES (
+                NEW.created_timestamp / 3600000,
+                NEW.status,
+                NEW.completed_timestamp IS NULL,
+                1
+            )
+            ON CONFLICT (hour, status, pending) DO UPDATE SET count = count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS barcode_counts_delete
+        AFTER DELETE ON barcodes
+        BEGIN
+            UPDATE barcode_counts SET count = count - 1
+            WHERE hour = OLD.created_timestamp / 3600000
+                AND status = OLD.status
+                AND pending = (OLD.completed_timestamp IS NULL);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS barcode_counts_update
+        AFTER UPDATE OF created_timestamp, completed_timestamp, status ON barcodes
+        WHEN OLD.created_timestamp / 3600000 != NEW.created_timestamp / 3600000
+            OR OLD.status != NEW.status
+            OR (OLD.completed_timestamp IS NULL) != (NEW.completed_timestamp IS NULL)
+        BEGIN
+            UPDATE barcode_counts SET count = count - 1
+            WHERE hour = OLD.created_timestamp / 3600000
+                AND status = OLD.status
+                AND pending = (OLD.completed_timestamp IS NULL);
+
+            INSERT INTO barcode_counts VALUES (
+                NEW.created_timestamp / 3600000,
+                NEW.status,
+                NEW.completed_timestamp IS NULL,
+                1
+            )
+            ON CONFLICT (hour, status, pending) DO UPDATE SET count = count + 1;
+        END;
+        """
+    )
+
+    if not exists:
+        await db.execute(
+            """
+            INSERT INTO barcode_counts
+            SELECT
+                created_timestamp / 3600000,
+                status,
+                completed_timestamp IS NULL,
+                COUNT(*)
+            FROM barcodes
+            GROUP BY 1, 2, 3
+            """
+        )
+
+
+async def migrate_real_timestamps(db):
+    """
+    Convert the REAL second timestamps of databases created before integer
+    milliseconds were used. SQLite cannot change a column type, so the
+    tables are copied.
+    """
+    print("🗄️ Migrating timestamps to integer milliseconds...")
+
+    await db.executescript(
+        """
+        BEGIN;
+
+        CREATE TABLE barcodes_migration (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            barcode TEXT NOT NULL,
+            created_timestamp INTEGER NOT NULL,
+            completed_timestamp INTEGER,
+            status TEXT NOT NULL DEFAULT 'Scanned'
+        );
+
+        INSERT INTO barcodes_migration
+        SELECT
+            id,
+            barcode,
+            CAST(ROUND(created_timestamp * 1000) AS INTEGER),
+            CAST(ROUND(completed_timestamp * 1000) AS INTEGER),
+            status
+        FROM barcodes;
+
+        DROP TABLE barcodes;
+        ALTER TABLE barcodes_migration RENAME TO barcodes;
+
+        CREATE TABLE settings_migration (
+            key TEXT PRIMARY KEY NOT NULL,
+            value TEXT NOT NULL,
+            created_timestamp INTEGER NOT NULL
+        );
+
+        INSERT INTO settings_migration
+        SELECT key, value, CAST(ROUND(created_timestamp * 1000) AS INTEGER)
+        FROM settings;
+
+        DROP TABLE settings;
+        ALTER TABLE settings_migration RENAME TO settings;
+
+        COMMIT;
+        """
+    )
+
+
+def to_record(
+    id, barcode, created_timestamp, completed_timestamp, status, device=None
+):
+    return data(
+        id=id,
+        barcode=barcode,
+        created_timestamp=created_timestamp,
+        completed_timestamp=completed_timestamp,
+        status=status,
+        device=device,
+    )
+
+
+async def insert_barcode(
+    barcode: str, status: str = "Scanned", device=None, created_timestamp=None
+):
+    created_timestamp = created_timestamp or timestamp()
+
+    async with db_transaction() as db:
+        cursor = await db.execute(
+            "INSERT INTO barcodes (barcode, created_timestamp, status, device) VALUES (?, ?, ?, ?)",
+            (barcode, created_timestamp, status, device),
+        )
+
+    recent.insert(
+        to_record(cursor.lastrowid, barcode, created_timestamp, None, status, device)
+    )
+
+
+async def set_loop_stats(process, metrics):
+    """Store the event loop watchdog metrics of a process."""
     async with db_transaction() as db:
         await db.execute(
-            "INSERT INTO barcodes (barcode, created_timestamp, status) VALUES (?, ?, ?)",
-            (barcode, timestamp(), status),
+            """
+            INSERT INTO loop_stats VALUES (?, ?, ?, ?)
+            ON CONFLICT (process) DO UPDATE SET
+                pid = excluded.pid,
+                metrics = excluded.metrics,
+                updated_timestamp = excluded.updated_timestamp
+            """,
+            (process, os.getpid(), dumps(metrics), timestamp()),
         )
 
 
+async def get_loop_stats():
+    """
+    Returns:
+        dict: Mapping of {process: watchdog metrics with pid and
+        updated_timestamp}
+    """
+    async with db_readonly() as db:
+        cursor = await db.execute(
+            "SELECT process, pid, metrics, updated_timestamp FROM loop_stats ORDER BY process"
+        )
+        return {
+            process: data(json.loads(metrics), pid=pid, updated_timestamp=updated)
+            async for process, pid, metrics, updated in cursor
+        }
+
+
+async def get_journal_sequence():
+    """
+    Returns:
+        int: Sequence of the last scan journal record merged, 0 if none
+    """
+    async with db_readonly() as db:
+        cursor = await db.execute("SELECT sequence FROM journal_state WHERE id = 0")
+        row = await cursor.fetchone()
+
+    return row and row[0] or 0
+
+
+async def merge_journal(records, status="Scanned"):
+    """
+    Insert scan journal records and remember the last merged sequence in the
+    same transaction, so a record is never merged twice.
+
+    Args:
+        records: List of (sequence, created_timestamp, barcode, device), in order
+
+    Returns:
+        int: Number of records inserted
+    """
+    if not records:
+        return 0
+
+    async with db_transaction() as db:
+        await db.executemany(
+            "INSERT INTO barcodes (barcode, created_timestamp, status, device) VALUES (?, ?, ?, ?)",
+            (
+                (barcode, created_timestamp, status, device)
+                for _, created_timestamp, barcode, device in records
+            ),
+        )
+        await db.execute(
+            "INSERT INTO journal_state VALUES (0, ?) "
+            "ON CONFLICT (id) DO UPDATE SET sequence = excluded.sequence",
+            (records[-1][0],),
+        )
+
+    # the ids were assigned by SQLite, reload the window on next use
+    recent.invalidate()
+
+    return len(records)
+
+
 async def read(
     limit=50,
     not_uploaded_only=False,
+    after_id=None,
 ):
     """
     Read records from the database.
@@ -122,31 +608,58 @@ async def read(
     Args:
         limit: Maximum number of records to return (default: 50)
         not_uploaded_only: If True, only return records where completed_timestamp is NULL (default: False)
+        after_id: If set, only return records with a greater id, oldest first (default: None)
 
     Returns:
         Generator yielding record dictionaries
     """
     async with db_readonly() as db:
-        query = "SELECT id, barcode, created_timestamp, completed_timestamp, status FROM barcodes"
+        query = "SELECT id, barcode, created_timestamp, completed_timestamp, status, device FROM barcodes"
+
+        conditions = []
+        params = []
 
         if not_uploaded_only:
-            query += " WHERE completed_timestamp IS NULL"
+            conditions.append("completed_timestamp IS NULL")
 
-        query += " ORDER BY created_timestamp DESC LIMIT ?"
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        if after_id is None:
+            query += " ORDER BY created_timestamp DESC LIMIT ?"
+        else:
+            query += " ORDER BY id LIMIT ?"
 
         cursor = await db.execute(
             query,
-            (limit,),
+            (*params, limit),
         )
 
-        async for id, barcode, created_timestamp, completed_timestamp, status in cursor:
-            yield data(
-                id=id,
-                barcode=barcode,
-                created_timestamp=timestamp_to_datetime(created_timestamp),
-                completed_timestamp=timestamp_to_datetime(completed_timestamp),
-                status=status,
-            )
+        async for row in cursor:
+            yield to_record(*row)
+
+
+async def read_recent(limit=50):
+    """
+    Read the most recent records from the in-memory window, falling back to
+    the database for anything beyond it.
+
+    Args:
+        limit: Maximum number of records to return (default: 50)
+
+    Returns:
+        Generator yielding record dictionaries, newest first
+    """
+    if limit > recent.size:
+        async for row in read(limit=limit):
+            yield row
+    else:
+        async for row in recent.get(limit):
+            yield row
 
 
 async def cleanup_db(seconds=86400):
@@ -166,13 +679,22 @@ async def cleanup_db(seconds=86400):
         cursor = await db.execute(
             "DELETE FROM barcodes WHERE created_timestamp < ?", (cutoff_time,)
         )
-        return cursor.rowcount
+
+        # hours emptied by the cleanup
+        await db.execute("DELETE FROM barcode_counts WHERE count <= 0")
+
+    recent.delete_before(cutoff_time)
+
+    return cursor.rowcount
 
 
 async def set_status_mapping(status_to_ids_mapping):
     """
-    Mark the specified records with their corresponding statuses using executescript.
-    This performs all updates in a single transaction for better performance.
+    Mark the specified records with their corresponding statuses.
+
+    The (status, id) pairs are streamed through one prepared statement, so
+    the SQL never grows with the number of records and statuses are never
+    interpolated into it. All updates run in a single transaction.
 
     Args:
         status_to_ids_mapping: Mapping of {status: [record_ids]} to update
@@ -185,47 +707,229 @@ async def set_status_mapping(status_to_ids_mapping):
 
     current_time = timestamp()
 
-    # Build a SQL script with all updates
-    script_parts = []
-    total_records = 0
+    total_records = sum(len(ids) for ids in status_to_ids_mapping.values())
+
+    if not total_records:
+        return 0
+
+    async with db_transaction() as db:
+        await db.executemany(
+            "UPDATE barcodes SET completed_timestamp = ?, status = ? WHERE id = ?",
+            (
+                (current_time, str(status), id)
+                for status, record_ids in status_to_ids_mapping.items()
+                for id in record_ids
+            ),
+        )
 
     for status, record_ids in status_to_ids_mapping.items():
-        if not record_ids:
-            continue
+        recent.update(record_ids, completed_timestamp=current_time, status=str(status))
+
+    return total_records
+
+
+async def get_summary(seconds=None):
+    """
+    Count records by status from the trigger maintained counters, without
+    touching the barcodes table.
+
+    Args:
+        seconds: Only count records created in the last `seconds`, rounded
+                down to the start of the hour (default: every record)
+
+    Returns:
+        dict: total, pending, statuses {status: count} and hours
+        {hour start timestamp: count}
+    """
+    since = seconds is not None and timestamp(seconds) // 3600000 or 0
+
+    async with db_readonly() as db:
+        cursor = await db.execute(
+            "SELECT hour, status, pending, count FROM barcode_counts WHERE hour >= ? AND count > 0",
+            (since,),
+        )
+        rows = await cursor.fetchall()
+
+    statuses = defaultdict(int)
+    hours = defaultdict(int)
+
+    for hour, status, pending, count in rows:
+        statuses[status] += count
+        hours[hour * 3600000] += count
+
+    return data(
+        total=sum(statuses.values()),
+        pending=sum(count for _, _, pending, count in rows if pending),
+        statuses=dict(statuses),
+        hours=dict(sorted(hours.items())),
+    )
+
+
+PERCENTILES = (50, 90, 99)
+
+
+def latency_bucket(column, digits=3, decades=10):
+    """
+    SQL expression rounding a millisecond latency down to `digits`
+    significant digits, so a histogram of latencies has a bounded number of
+    rows per decade, whatever the number of records.
+    """
+    # short latencies first, they are the most common
+    cases = " ".join(
+        f"WHEN ({column}) < {10 ** (digits + i)} "
+        f"THEN ({column}) / {10 ** i} * {10 ** i}"
+        for i in range(1, decades)
+    )
+
+    return (
+        f"CASE WHEN ({column}) < {10**digits} THEN {column} {cases} "
+        f"ELSE ({column}) / {10**decades} * {10**decades} END"
+    )
 
-        # Create comma-separated list of record IDs for this status
-        id_list = ",".join(str(id) for id in record_ids)
 
-        script_parts.append(
-            f"UPDATE barcodes SET completed_timestamp = {current_time}, "
-            f"status = '{status}' WHERE id IN ({id_list});"
+async def get_stats(seconds=3600):
+    """
+    Aggregate throughput and upload latency over the last `seconds`.
+
+    Every query is a range scan of the covering created_timestamp index, or
+    of the pending index, and only aggregates are returned to Python:
+    counts per status and device, and latencies as a histogram bucketed to
+    three significant digits to read the percentiles from, instead of
+    sorting every row. Percentiles are the lower bound of their bucket,
+    within 1% of the exact value.
+
+    Returns:
+        dict: scans, per minute rates, latency percentiles (ms), statuses,
+        scans and latency per device and pending backlog
+    """
+    since = timestamp(seconds)
+
+    async with db_readonly() as db:
+        cursor = await db.execute(
+            """
+            SELECT COUNT(*), MAX(scans) FROM (
+                SELECT COUNT(*) AS scans FROM barcodes
+                WHERE created_timestamp >= ?
+                GROUP BY created_timestamp / 60000
+            )
+            """,
+            (since,),
         )
-        total_records += len(record_ids)
+        minutes, peak = await cursor.fetchone()
 
-    if not script_parts:
-        return 0
+        cursor = await db.execute(
+            """
+            SELECT
+                status,
+                device,
+                COUNT(*),
+                COUNT(completed_timestamp),
+                SUM(completed_timestamp - created_timestamp)
+            FROM barcodes
+            WHERE created_timestamp >= ?
+            GROUP BY status, device
+            """,
+            (since,),
+        )
+        statuses = defaultdict(int)
+        devices = defaultdict(lambda: [0, 0, 0])
 
-    sql_script = "\n".join(script_parts)
+        async for status, device, count, completed, total in cursor:
+            statuses[status] += count
+            totals = devices[device or "unknown"]
+            totals[0] += count
+            totals[1] += completed
+            totals[2] += total or 0
 
-    # Execute all updates in a single transaction
-    async with db_transaction() as db:
-        await db.executescript(sql_script)
+        cursor = await db.execute(
+            f"""
+            SELECT {latency_bucket("completed_timestamp - created_timestamp")} AS bucket,
+                COUNT(*)
+            FROM barcodes
+            WHERE created_timestamp >= ? AND completed_timestamp IS NOT NULL
+            GROUP BY bucket
+            ORDER BY bucket
+            """,
+            (since,),
+        )
+        histogram = await cursor.fetchall()
 
-    return total_records
+        cursor = await db.execute(
+            "SELECT COUNT(*), MIN(created_timestamp) FROM barcodes INDEXED BY barcodes_pending "
+            "WHERE completed_timestamp IS NULL"
+        )
+        pending, oldest = await cursor.fetchone()
+
+    completed = sum(count for _, count in histogram)
+    latency_total = sum(total for _, _, total in devices.values())
+
+    # nearest-rank percentiles, ranks are computed with integer ceil
+    ranks = sorted((max(1, (completed * p + 99) // 100), f"p{p}") for p in PERCENTILES)
+    percentiles = {name: None for _, name in ranks}
+    seen = 0
+
+    for latency, count in histogram:
+        seen += count
+        while ranks and ranks[0][0] <= seen:
+            percentiles[ranks.pop(0)[1]] = latency
+
+    scans = sum(statuses.values())
+
+    return data(
+        seconds=seconds,
+        scans=scans,
+        scans_per_minute=round(scans / max(seconds / 60, 1), 2),
+        peak_per_minute=peak or 0,
+        active_minutes=minutes,
+        latency_ms={
+            "average": completed and round(latency_total / completed) or None,
+            **percentiles,
+        },
+        statuses=dict(statuses),
+        devices={
+            device: data(
+                scans=count,
+                scans_per_minute=round(count / max(seconds / 60, 1), 2),
+                latency_ms=completed and round(total / completed) or None,
+            )
+            for device, (count, completed, total) in devices.items()
+        },
+        pending=pending,
+        pending_age_seconds=oldest and round((timestamp() - oldest) / 1000, 1),
+    )
 
 
+recent = RecentRows()
+
+
+settings_cache = data(signature=None, settings=None)
 
 
 async def get_settings():
     """
     Get all settings.
 
+    The settings are read again only after `set_setting` rewrote the
+    SETTINGS_STAMP file, in any process, so calling this every cycle costs a
+    stat and no database read.
+
     Returns:
         dict: Dictionary of all settings (key-value pairs)
     """
+    signature = file_signature(SETTINGS_STAMP)
+
+    if settings_cache.settings is not None and signature == settings_cache.signature:
+        return data(settings_cache.settings)
 
     settings = data(
-        TOKEN="", URL="", BARCODE_VAR="", HOSTNAME_VAR="", STATUS_VAR="", INSECURE=""
+        TOKEN="",
+        URL="",
+        BARCODE_VAR="",
+        HOSTNAME_VAR="",
+        STATUS_VAR="",
+        INSECURE="",
+        FORMAT="",
+        JOURNAL="",
     )
 
     async with db_readonly() as db:
@@ -234,7 +938,22 @@ async def get_settings():
         async for key, value in cursor:
             settings[key] = value
 
-        return settings
+    settings_cache.update(signature=signature, settings=settings)
+
+    return data(settings)
+
+
+async def get_tuning():
+    """
+    Get the performance knobs from the settings, typed and validated, and
+    keep them as the current `tuning`.
+
+    Returns:
+        dict: Mapping of {knob: value}, see TUNABLES
+    """
+    tuning.update(tuning_from(await get_settings()))
+
+    return tuning
 
 
 async def set_setting(settings_dict):
@@ -273,4 +992,9 @@ async def set_setting(settings_dict):
             params,
         )
 
-        return cursor.rowcount
+    settings_cache.settings = None
+
+    # a write to the SD card can stall, keep it off the event loop
+    await asyncio.to_thread(write_stamp, SETTINGS_STAMP, str(current_time))
+
+    return cursor.rowcount
@@ -0,0 +1,72 @@
+from piscanner.utils.datastructures import data
+
+
+def knob(type, default, minimum, maximum):
+    return data(type=type, default=default, minimum=minimum, maximum=maximum)
+
+
+# performance settings the running services pick up without a restart,
+# e.g. piscanner://settings?SENDER_INTERVAL=2&SENDER_LIMIT=200
+TUNABLES = data(
+    # seconds between reads of pending records by the sender
+    SENDER_INTERVAL=knob(float, 5, 0.1, 3600),
+    # pending records read and dispatched at once by the sender
+    SENDER_LIMIT=knob(int, 100, 1, 10000),
+    # hours of records kept by the cleanup
+    RETENTION_HOURS=knob(float, 24, 1, 24 * 365),
+    # seconds between two cleanups
+    CLEANUP_INTERVAL=knob(float, 3600, 60, 86400),
+    # seconds a light stays on and off for a flash
+    LIGHT_DURATION=knob(float, 0.3, 0.05, 10),
+    LIGHT_WAIT=knob(float, 0.2, 0, 10),
+    # seconds between two checks of the status lights
+    LIGHTS_INTERVAL=knob(float, 1, 0.1, 60),
+    # seconds during which a repeated barcode from the same scanner is ignored
+    DEDUPE_SECONDS=knob(float, 0, 0, 3600),
+    # barcodes per second stored for each scanner, 0 for no limit
+    DEVICE_RATE=knob(float, 0, 0, 1000),
+)
+
+# last values loaded, for code that cannot wait for `get_tuning`
+tuning = data((key, knob.default) for key, knob in TUNABLES.items())
+
+
+def parse_tunable(key, value):
+    """
+    Convert a setting value to the type of its knob, within its range.
+
+    Raises:
+        ValueError: when the value is not a number or out of range
+    """
+    knob = TUNABLES[key]
+
+    if value in (None, ""):
+        return knob.default
+
+    parsed = knob.type(value)
+
+    if not knob.minimum <= parsed <= knob.maximum:
+        raise ValueError(
+            f"{key}={value} is outside {knob.minimum}..{knob.maximum}"
+        )
+
+    return parsed
+
+
+def tuning_from(settings):
+    """
+    Typed knobs from the flat settings, invalid stored values fall back to
+    the defaults.
+
+    Returns:
+        dict: Mapping of {knob: value}
+    """
+    result = data()
+
+    for key, knob in TUNABLES.items():
+        try:
+            result[key] = parse_tunable(key, settings.get(key))
+        except ValueError:
+            result[key] = knob.default
+
+    return result
@@ -0,0 +1,127 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from piscanner.utils.datastructures import data
+
+
+class LoopWatchdog:
+    """
+    Record the stalls of the event loop, the times it could not run any
+    other task, like reading scanner input, for more than `threshold`
+    seconds.
+
+    A coroutine on the loop wakes up every `interval` seconds and measures
+    how late it is. A separate thread watches the same heartbeat and, while
+    the loop is stuck, samples the stack of the loop thread together with the
+    task that is running, so every stall points at the blocking call.
+
+    Usage:
+        asyncio.create_task(watchdog.run())
+        asyncio.create_task(watchdog.publish("listener"))
+        ...
+        watchdog.metrics()
+    """
+
+    def __init__(self, threshold=0.1, interval=0.05, size=50):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=size)
+        self.count = 0
+        self.max_lag = 0
+        self.heartbeat = None
+        self.sample = None
+        self.loop = None
+        self.thread_id = None
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+
+        threading.Thread(target=self.watch, name="watchdog", daemon=True).start()
+
+        while True:
+            beat = self.heartbeat = time.monotonic()
+
+            await asyncio.sleep(self.interval)
+
+            lag = time.monotonic() - beat - self.interval
+
+            if lag >= self.threshold:
+                sample = self.sample
+                self.record(lag, sample and sample.beat == beat and sample or None)
+
+    def watch(self):
+        while True:
+            time.sleep(self.interval)
+
+            beat = self.heartbeat
+
+            if self.sample and self.sample.beat == beat:
+                continue
+
+            if time.monotonic() - beat - self.interval >= self.threshold:
+                self.sample = self.capture(beat)
+
+    def capture(self, beat):
+        frame = sys._current_frames().get(self.thread_id)
+        task = asyncio.current_task(self.loop)
+
+        return data(
+            beat=beat,
+            task=task and task.get_name() or None,
+            coroutine=task and task.get_coro().__qualname__ or None,
+            stack=frame and traceback.format_stack(frame) or [],
+        )
+
+    def record(self, lag, sample=None):
+        self.count += 1
+        self.max_lag = max(self.max_lag, lag)
+
+        stall = data(
+            at=time.time(),
+            lag_ms=round(lag * 1000),
+            task=sample and sample.task,
+            coroutine=sample and sample.coroutine,
+            stack=sample and sample.stack or [],
+        )
+
+        self.stalls.append(stall)
+
+        where = stall.stack and stall.stack[-1].strip().splitlines()[0] or "unknown"
+
+        print(
+            f"🐢 Event loop stalled for {stall.lag_ms} ms in {stall.coroutine or 'callback'}, {where}"
+        )
+
+    async def publish(self, process, interval=10):
+        """
+        Store the metrics under the `process` name whenever they changed, so
+        the stalls of every process are visible from the server.
+        """
+        from piscanner.utils.storage import set_loop_stats
+
+        published = None
+
+        while True:
+            if self.count != published:
+                published = self.count
+                await set_loop_stats(process, self.metrics())
+
+            await asyncio.sleep(interval)
+
+    def metrics(self):
+        return data(
+            enabled=self.loop is not None,
+            threshold_ms=round(self.threshold * 1000),
+            stalls=self.count,
+            max_lag_ms=round(self.max_lag * 1000),
+            recent=list(reversed(self.stalls)),
+        )
+
+
+watchdog = LoopWatchdog()